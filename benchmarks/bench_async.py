@@ -0,0 +1,49 @@
+""" Gathers concurrent mounts through AsyncVeraCryptInterface against a
+simulated driver which injects ioctl latency.
+
+Run with: python -m benchmarks.bench_async
+"""
+
+import asyncio
+import time
+
+from crypt_interface.driver_interfaces.win.veracrypt import models
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedDriverTransport)
+from crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface \
+    import AsyncVeraCryptInterface
+
+MOUNTS = 24
+IOCTL_LATENCY = 0.05
+
+
+def volume(drive_no):
+    vol = models.Volume()
+    vol.path = 'C:\\containers\\{}.hc'.format(drive_no)
+    vol.drive_no = drive_no
+    return vol
+
+
+async def run(max_workers):
+    transport = SimulatedDriverTransport(latency=IOCTL_LATENCY)
+    for i in range(MOUNTS):
+        transport.add_container(volume(i).path, b'password')
+
+    async with AsyncVeraCryptInterface(
+            transport=transport, max_workers=max_workers) as vci:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            vci.mount_volume(volume(i), b'password')
+            for i in range(MOUNTS)))
+        return time.perf_counter() - start
+
+
+def main():
+    print('sequential estimate: {:6.3f} s'.format(MOUNTS * IOCTL_LATENCY))
+    for max_workers in (1, 4, 8):
+        elapsed = asyncio.run(run(max_workers))
+        print('{:>2} workers: {:6.3f} s'.format(max_workers, elapsed))
+
+
+if __name__ == '__main__':
+    main()
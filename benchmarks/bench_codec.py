@@ -0,0 +1,55 @@
+""" Compares the reflective Field based decoding with the compiled codec
+plan on a fully populated MountListStruct.
+
+Run with: python -m benchmarks.bench_codec
+"""
+
+import timeit
+
+from crypt_interface.driver_interfaces.win import win_constants
+from crypt_interface.driver_interfaces.win.veracrypt import (
+    driver_models, models)
+
+NUMBER = 200
+
+
+def populated_mount_list(count=win_constants.MAX_VOLUMES):
+    """ Builds a MountListStruct with the first count slots mounted """
+
+    mount_list = driver_models.MountListStruct()
+    for i in range(count):
+        mount_list.ulMountedDrives |= 1 << i
+        mount_list.wszVolume[i].value = '\\??\\C:\\containers\\{}.hc'.format(i)
+        mount_list.wszLabel[i].value = 'volume {}'.format(i)
+        mount_list.volumeID[i].value = '{:032x}'.format(i)[:31]
+        mount_list.diskLength[i] = (i + 1) << 30
+        mount_list.ea[i] = i % 12
+        mount_list.volumeType[i] = i % 5
+        mount_list.truecryptMode[i] = i % 2
+
+    return mount_list
+
+
+def reflective(mount_list):
+    return [models.Volume.from_veracrypt_mount_list_struct(mount_list, i)
+            for i in range(win_constants.MAX_VOLUMES)]
+
+
+def compiled(mount_list):
+    return models.Volume.mount_list_to_volume_list(mount_list)
+
+
+def main():
+    mount_list = populated_mount_list()
+
+    assert [v.to_dict() for v in reflective(mount_list)] == \
+        [v.to_dict() for v in compiled(mount_list)]
+
+    for func in (reflective, compiled):
+        elapsed = timeit.timeit(lambda: func(mount_list), number=NUMBER)
+        print('{:>10}: {:8.1f} us/struct'.format(
+            func.__name__, elapsed / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
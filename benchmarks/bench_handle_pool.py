@@ -0,0 +1,37 @@
+""" Compares get_mounted_volumes with and without handle reuse.
+
+Run with: python -m benchmarks.bench_handle_pool
+"""
+
+import time
+
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedDriverTransport)
+from crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface \
+    import VeraCryptInterface
+
+CALLS = 2000
+OPEN_LATENCY = 0.0002
+
+
+def run(pool_size):
+    transport = SimulatedDriverTransport(open_latency=OPEN_LATENCY)
+
+    with VeraCryptInterface(transport=transport, pool_size=pool_size) as vci:
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            vci.get_mounted_volumes()
+        elapsed = time.perf_counter() - start
+
+    return elapsed, transport.open_count
+
+
+def main():
+    for label, pool_size in (('no reuse', 0), ('pooled', 4)):
+        elapsed, opens = run(pool_size)
+        print('{:>10}: {:8.1f} us/call, {} handle opens'.format(
+            label, elapsed / CALLS * 1e6, opens))
+
+
+if __name__ == '__main__':
+    main()
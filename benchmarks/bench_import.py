@@ -0,0 +1,62 @@
+""" Measures the import time of the package entry points, each in a fresh
+interpreter, and checks it against a budget.
+
+Run with: python -m benchmarks.bench_import [--repeat 5]
+"""
+
+import argparse
+import subprocess
+import sys
+
+# module: budget in milliseconds, for the cumulative import time of the
+# module on top of the interpreter startup
+IMPORT_BUDGETS = {
+    'crypt_interface.driver_interfaces.base_crypt_interface': 15,
+    'crypt_interface.driver_interfaces.win': 5,
+    'crypt_interface.driver_interfaces.linux.veracrypt.veracrypt_interface':
+        25,
+    'crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface':
+        40,
+}
+
+
+def import_time(module):
+    """ Returns the cumulative import time of a module, in milliseconds,
+    as reported by -X importtime in a fresh interpreter
+    """
+
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE, check=True).stderr.decode()
+
+    for line in output.splitlines():
+        _, _, cumulative, name = (
+            part.strip() for part in line.replace(':', '|', 1).split('|'))
+        if name == module:
+            return int(cumulative) / 1000
+
+    raise ValueError('{} was not imported'.format(module))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of fresh imports per module')
+    args = parser.parse_args(argv)
+
+    over_budget = 0
+    for module, budget in IMPORT_BUDGETS.items():
+        elapsed = min(import_time(module) for _ in range(args.repeat))
+        status = 'ok'
+        if elapsed > budget:
+            status = 'OVER BUDGET'
+            over_budget += 1
+
+        print('{:>8.1f} ms / {:>3} ms  {}  {}'.format(
+            elapsed, budget, status, module))
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
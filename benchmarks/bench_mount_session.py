@@ -0,0 +1,55 @@
+""" Compares the per-mount timings of containers sharing a password, mounted
+one by one and through a mount session using the driver password cache,
+against a simulated driver spending a fixed time per key derivation.
+
+Run with: python -m benchmarks.bench_mount_session
+"""
+
+from crypt_interface.driver_interfaces.win.veracrypt import constants, models
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedDriverTransport, SimulatedVeraCryptInterface)
+
+VOLUMES = 8
+DERIVATION_LATENCY = 0.005
+
+
+def setup():
+    driver = SimulatedDriverTransport(derivation_latency=DERIVATION_LATENCY)
+    interface = SimulatedVeraCryptInterface(driver)
+
+    volumes = []
+    for i in range(VOLUMES):
+        volume = models.Volume()
+        volume.path = 'C:\\containers\\{}.hc'.format(i)
+        volume.drive_no = i
+        driver.add_container(volume.path, b'password',
+                             pkcs5_prf=constants.Pkcs5Prf.SHA256)
+        volumes.append(volume)
+
+    return driver, interface, volumes
+
+
+def report(name, results, driver):
+    timings = ', '.join('{:.1f}'.format(result.elapsed * 1000)
+                        for result in results)
+    print('{:>10}: {} ms per mount, {} key derivations'.format(
+        name, timings, driver.derivation_count))
+
+
+def main():
+    driver, interface, volumes = setup()
+    result = interface.mount_volumes(
+        [(volume, b'password') for volume in volumes], max_workers=1)
+    report('one by one', result.results, driver)
+    interface.close()
+
+    driver, interface, volumes = setup()
+    with interface.mount_session(b'password') as session:
+        for volume in volumes:
+            session.mount(volume)
+    report('session', session.results, driver)
+    interface.close()
+
+
+if __name__ == '__main__':
+    main()
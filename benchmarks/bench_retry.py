@@ -0,0 +1,60 @@
+""" Runs a burst of concurrent listings against a simulated driver which
+accepts few handles at once, with and without the retry policy, and reports
+the failures, the latency and the driver calls.
+
+Run with: python -m benchmarks.bench_retry
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crypt_interface.driver_interfaces import exceptions, retry
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedDriverTransport, SimulatedVeraCryptInterface)
+from crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface \
+    import RETRY_RULES
+
+BURST = 50
+MAX_HANDLES = 4
+LATENCY = 0.002
+
+
+def run_burst(retry_policy):
+    driver = SimulatedDriverTransport(latency=LATENCY, max_handles=MAX_HANDLES)
+    interface = SimulatedVeraCryptInterface(
+        driver, pool_size=MAX_HANDLES, retry_policy=retry_policy)
+
+    def operation(_):
+        start = time.perf_counter()
+        try:
+            interface.get_mounted_volumes()
+        except exceptions.DriverException:
+            return None
+
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=BURST) as executor:
+        latencies = list(executor.map(operation, range(BURST)))
+
+    interface.close()
+
+    succeeded = [latency for latency in latencies if latency is not None]
+    return BURST - len(succeeded), max(succeeded), driver
+
+
+def main():
+    policies = (
+        ('no retry', None),
+        ('retry', retry.RetryPolicy(
+            RETRY_RULES, max_concurrent_retries=MAX_HANDLES)),
+    )
+
+    for name, policy in policies:
+        failed, max_latency, driver = run_burst(policy)
+        print('{:>8}: {}/{} failed, {:.1f} ms max latency, {} opens, '
+              '{} ioctls'.format(name, failed, BURST, max_latency * 1000,
+                                 driver.open_count, driver.ioctl_count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+""" Load test of the full VeraCryptInterface code path against the
+simulated driver.
+
+Run with: python -m benchmarks.bench_simulated_driver
+"""
+
+import time
+
+from crypt_interface.driver_interfaces.base_crypt_interface import (
+    CryptInterface)
+from crypt_interface.driver_interfaces.win.veracrypt import models
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedVeraCryptInterface)
+
+CYCLES = 1000
+VOLUMES = 4
+
+
+def main():
+    ci = CryptInterface(SimulatedVeraCryptInterface)
+
+    volumes = []
+    for i in range(VOLUMES):
+        volume = models.Volume()
+        volume.path = 'C:\\containers\\{}.hc'.format(i)
+        volume.drive_no = i
+        ci.interface.driver.add_container(volume.path, b'password')
+        volumes.append(volume)
+
+    operations = 0
+    start = time.perf_counter()
+    for _ in range(CYCLES):
+        for volume in volumes:
+            ci.mount_volume(volume, b'password')
+        mounted = ci.get_mounted_volumes()
+        assert len(mounted) == VOLUMES
+        for volume in volumes:
+            ci.dismount_volume(volume)
+        operations += 2 * VOLUMES + 1
+    elapsed = time.perf_counter() - start
+
+    ci.close()
+    print('{} operations in {:.3f} s: {:.0f} ops/s'.format(
+        operations, elapsed, operations / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+""" Measures the bytes allocated per get_mounted_volumes call, with fresh
+structs for every call and with the per-interface struct arena.
+
+Run with: python -m benchmarks.bench_struct_arena
+"""
+
+import tracemalloc
+
+from crypt_interface.driver_interfaces.win.veracrypt.simulated_driver import (
+    SimulatedDriverTransport)
+from crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface \
+    import VeraCryptInterface
+
+CALLS = 200
+
+
+class FreshArena(object):
+    """ Arena stand-in which allocates a new struct on every request """
+
+    def get(self, struct_class):
+        return struct_class()
+
+    def clear(self):
+        pass
+
+
+def run(arena=None):
+    vci = VeraCryptInterface(transport=SimulatedDriverTransport())
+    if arena is not None:
+        vci.arena = arena
+
+    # warm up the pool and the arena
+    vci.get_mounted_volumes()
+
+    tracemalloc.start()
+    for _ in range(CALLS):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        vci.get_mounted_volumes()
+        peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    vci.close()
+    return peak - before
+
+
+def main():
+    print('{:>10}: {:8d} peak bytes/call'.format('fresh', run(FreshArena())))
+    print('{:>10}: {:8d} peak bytes/call'.format('arena', run()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+""" Micro-benchmark suite for the struct/codec hot paths. Runs without the
+driver, emits JSON results and compares them against a stored baseline.
+
+Run with:
+    python -m benchmarks.suite [--output FILE] [--baseline FILE]
+                               [--threshold 0.5] [--save-baseline]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from pathlib import Path
+
+from benchmarks.bench_codec import populated_mount_list
+from crypt_interface.driver_interfaces.exceptions import DriverException
+from crypt_interface.driver_interfaces.win import (
+    base_win_driver_models, win_constants)
+from crypt_interface.driver_interfaces.win.veracrypt import (
+    constants, driver_models, models, veracrypt_interface)
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+# maximum accepted slowdown relative to the baseline
+DEFAULT_THRESHOLD = 0.5
+
+REPEAT = 7
+
+
+def bench_mount_list_allocation():
+    return driver_models.MountListStruct
+
+
+def bench_check_excess_buffer(level, stray_bytes=0):
+    mount_list = driver_models.MountListStruct()
+    for i in range(stray_bytes):
+        mount_list._buffer[i * 97] = 0xff
+
+    def check():
+        try:
+            mount_list.check_excess_buffer(level)
+        except DriverException:
+            pass
+
+    return check
+
+
+def bench_mount_list_to_volume_list(count):
+    mount_list = populated_mount_list(count)
+    return lambda: models.Volume.mount_list_to_volume_list(mount_list)
+
+
+def bench_mount_struct_population():
+    password = b'correct horse battery staple'
+
+    def populate():
+        mount_buffer = driver_models.MountStruct()
+        mount_buffer.wszVolume = 'C:\\containers\\volume.hc'
+        mount_buffer.VolumePassword.write(password)
+        mount_buffer.nDosDriveNo = 5
+        mount_buffer.bMountRemovable = win_constants.TRUE
+        mount_buffer.bMountManager = win_constants.TRUE
+        mount_buffer.bPreserveTimestamp = win_constants.TRUE
+
+    return populate
+
+
+def bench_prepend_error_message(val):
+    return lambda: veracrypt_interface.prepend_error_code_message(
+        val=val, enum_class=constants.MountErrorCodes)
+
+
+# name: (setup function, number of calls per timing)
+BENCHMARKS = {
+    'mount_list_allocation': (bench_mount_list_allocation, 2000),
+    'check_excess_buffer_fast': (lambda: bench_check_excess_buffer(
+        base_win_driver_models.IntegrityLevel.FAST), 2000),
+    'check_excess_buffer_forensic': (lambda: bench_check_excess_buffer(
+        base_win_driver_models.IntegrityLevel.FORENSIC,
+        stray_bytes=16), 500),
+    'mount_list_to_volume_list_0': (
+        lambda: bench_mount_list_to_volume_list(0), 2000),
+    'mount_list_to_volume_list_2': (
+        lambda: bench_mount_list_to_volume_list(2), 1000),
+    'mount_list_to_volume_list_26': (
+        lambda: bench_mount_list_to_volume_list(26), 200),
+    'mount_struct_population': (bench_mount_struct_population, 2000),
+    'prepend_error_message_known': (
+        lambda: bench_prepend_error_message(
+            constants.MountErrorCodes.ACCESS_DENIED.value), 10000),
+    'prepend_error_message_unknown': (
+        lambda: bench_prepend_error_message(42), 10000),
+}
+
+
+def run(names=None):
+    """ Runs the benchmarks
+
+    :param names: names of the benchmarks to run, defaults to all
+    :return: dict of name: best time per call, in microseconds
+    """
+
+    results = {}
+    for name, (setup, number) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        func = setup()
+        timings = timeit.repeat(func, number=number, repeat=REPEAT)
+        results[name] = min(timings) / number * 1e6
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Compares results against a baseline
+
+    :return: dict of name: (baseline, current, ratio) for the regressions
+    """
+
+    regressions = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current > previous * (1 + threshold):
+            regressions[name] = (previous, current, current / previous)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH),
+                        help='baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='accepted slowdown ratio over the baseline')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.names)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'unit': 'us/call',
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(output + '\n')
+        return 0
+
+    if not baseline_path.exists():
+        return 0
+
+    baseline = json.loads(baseline_path.read_text())['results']
+    regressions = compare(results, baseline, args.threshold)
+    for name, (previous, current, ratio) in sorted(regressions.items()):
+        print('REGRESSION {}: {:.2f} -> {:.2f} us/call ({:.0%})'.format(
+            name, previous, current, ratio - 1), file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
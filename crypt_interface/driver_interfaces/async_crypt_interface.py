@@ -0,0 +1,114 @@
+from functools import partial
+
+# asyncio and concurrent.futures are imported on first use, as they make
+# up most of the package import time
+
+
+class BaseAsyncCryptInterface(object):
+    """ Abstract asyncio interface for all Crypt Interfaces """
+
+    async def get_mounted_volumes(self):
+        """ Retrieves a list of mounted volumes """
+
+        raise NotImplementedError
+
+    async def get_volume_properties(self, *args, **kwargs):
+        """ Retrieves the properties of mounted volumes """
+
+        raise NotImplementedError
+
+    async def mount_volume(self, *args, **kwargs):
+        """ Mounts a volume """
+
+        raise NotImplementedError
+
+    async def dismount_volume(self, *args, **kwargs):
+        """ Dismounts a volume """
+
+        raise NotImplementedError
+
+    async def close(self):
+        """ Releases any resources held by the interface """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, typ, val, tb):
+        await self.close()
+
+
+class AsyncCryptInterface(BaseAsyncCryptInterface):
+    """ Runs a blocking interface on a bounded, dedicated executor.
+
+    Operations on the same drive number are serialised. Mounts without a
+    drive number aren't, the interface reserves a distinct free letter for
+    each of them. Cancelling an operation which hasn't started yet removes
+    it from the executor queue, while an operation already running in the
+    driver is left to complete.
+    """
+
+    def __init__(self, interface_class, *args, max_workers=4, **kwargs):
+        """
+        :param interface_class: the blocking interface class
+        :param max_workers: maximum number of concurrent driver calls
+        """
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.interface = interface_class(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='crypt-interface')
+
+        self._drive_locks = {}
+
+    def _drive_lock(self, drive_no):
+        """ Returns the lock serialising the operations on a drive """
+
+        import asyncio
+
+        lock = self._drive_locks.get(drive_no)
+        if lock is None:
+            lock = self._drive_locks[drive_no] = asyncio.Lock()
+
+        return lock
+
+    async def _run(self, func, *args, **kwargs):
+        """ Runs a blocking call on the executor """
+
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, partial(func, *args, **kwargs))
+
+    async def _run_on_drive(self, drive_no, func, *args, **kwargs):
+        """ Runs a blocking call on the executor, serialised with the other
+        operations on the drive. Calls without a drive number aren't
+        serialised.
+        """
+
+        if drive_no is None:
+            return await self._run(func, *args, **kwargs)
+
+        async with self._drive_lock(drive_no):
+            return await self._run(func, *args, **kwargs)
+
+    async def get_mounted_volumes(self):
+        return await self._run(self.interface.get_mounted_volumes)
+
+    async def get_volume_properties(self, *args, **kwargs):
+        return await self._run(
+            self.interface.get_volume_properties, *args, **kwargs)
+
+    async def mount_volume(self, volume, *args, **kwargs):
+        return await self._run_on_drive(
+            volume.drive_no, self.interface.mount_volume, volume,
+            *args, **kwargs)
+
+    async def dismount_volume(self, volume, *args, **kwargs):
+        return await self._run_on_drive(
+            volume.drive_no, self.interface.dismount_volume, volume,
+            *args, **kwargs)
+
+    async def close(self):
+        await self._run(self.interface.close)
+        self.executor.shutdown(wait=False)
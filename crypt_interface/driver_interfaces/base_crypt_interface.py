@@ -1,3 +1,123 @@
+import copy
+import importlib
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from crypt_interface.driver_interfaces.exceptions import DriverException
+
+# a volume to be mounted along with its password
+MountRequest = namedtuple('MountRequest', ['volume', 'password'])
+
+# backend name: (module, interface class name), imported on first use
+BACKENDS = {
+    'veracrypt-windows': (
+        'crypt_interface.driver_interfaces.win.veracrypt.veracrypt_interface',
+        'VeraCryptInterface'),
+    'veracrypt-linux': (
+        'crypt_interface.driver_interfaces.linux.veracrypt'
+        '.veracrypt_interface', 'LinuxVeraCryptInterface'),
+    'veracrypt-simulated': (
+        'crypt_interface.driver_interfaces.win.veracrypt.simulated_driver',
+        'SimulatedVeraCryptInterface'),
+}
+
+# platform independent name: backend name
+BACKEND_ALIASES = {
+    'veracrypt': 'veracrypt-windows' if sys.platform == 'win32'
+    else 'veracrypt-linux',
+}
+
+
+def register_backend(name, module, class_name):
+    """ Registers an interface class, to be imported when first resolved
+
+    :param name: the backend name
+    :param module: the absolute name of the module defining the class
+    :param class_name: the name of the interface class
+    """
+
+    BACKENDS[name] = (module, class_name)
+
+
+def resolve_backend(name):
+    """ Imports and returns the interface class of a backend
+
+    :param name: a name of BACKENDS or BACKEND_ALIASES
+    :raises DriverException: if the backend is unknown
+    """
+
+    try:
+        module, class_name = BACKENDS[BACKEND_ALIASES.get(name, name)]
+    except KeyError:
+        raise DriverException('Unknown backend "{}". Available: {}'.format(
+            name, ', '.join(sorted(set(BACKENDS) | set(BACKEND_ALIASES)))))
+
+    return getattr(importlib.import_module(module), class_name)
+
+
+class MountResult(object):
+    """ Outcome of a single mount within a bulk mount """
+
+    def __init__(self, request, error=None, elapsed=0.0):
+        """
+        :param request: the MountRequest
+        :param error: the exception raised by the mount, if any
+        :param elapsed: duration of the mount in seconds
+        """
+
+        self.request = request
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<{}: {} {}>'.format(
+            self.__class__.__name__, self.request.volume.path,
+            'ok' if self.succeeded else self.error)
+
+    __str__ = __repr__
+
+
+class BulkMountResult(object):
+    """ Outcome of a bulk mount """
+
+    def __init__(self, results, wall_clock):
+        """
+        :param results: list of MountResults, in request order
+        :param wall_clock: duration of the whole bulk mount in seconds
+        """
+
+        self.results = results
+        self.wall_clock = wall_clock
+
+    @property
+    def summed_latency(self):
+        """ Sum of the individual mount durations, in seconds """
+
+        return sum(result.elapsed for result in self.results)
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.succeeded]
+
+    def __repr__(self):
+        return '<{}: {} ok, {} failed, {:.3f}s wall clock, ' \
+               '{:.3f}s summed>'.format(
+                   self.__class__.__name__, len(self.succeeded),
+                   len(self.failed), self.wall_clock, self.summed_latency)
+
+    __str__ = __repr__
+
+
 class BaseCryptInterface(object):
     """ Abstract interface for all Crypt Interfaces """
 
@@ -6,6 +126,31 @@ class BaseCryptInterface(object):
 
         raise NotImplementedError
 
+    def poll_mounted_volumes(self, mounted_drives=None):
+        """ Retrieves the bitmask of the drive numbers with mounted volumes
+        and, if it differs from mounted_drives, the mounted volumes
+
+        :param mounted_drives: bitmask returned by a previous poll
+        :return: tuple of the bitmask and the list of mounted volumes, or
+        None instead of the list if the bitmask didn't change
+        """
+
+        volumes = self.get_mounted_volumes()
+
+        mask = 0
+        for volume in volumes:
+            mask |= 1 << volume.drive_no
+
+        if mask == mounted_drives:
+            return mask, None
+
+        return mask, volumes
+
+    def get_volume_properties(self, *args, **kwargs):
+        """ Retrieves the properties of mounted volumes """
+
+        raise NotImplementedError
+
     def mount_volume(self, *args, **kwargs):
         """ Mounts a volume """
 
@@ -16,6 +161,57 @@ class BaseCryptInterface(object):
 
         raise NotImplementedError
 
+    def dismount_all(self, *args, **kwargs):
+        """ Dismounts all volumes """
+
+        raise NotImplementedError
+
+    def _mount_request(self, request):
+        """ Mounts the volume of a MountRequest, for mount_volumes """
+
+        self.mount_volume(request.volume, request.password)
+
+    def mount_volumes(self, requests, max_workers=4):
+        """ Mounts several volumes concurrently. A failed mount doesn't
+        abort the others, the exception it raised is stored in its result,
+        whether it comes from the driver or e.g. from an invalid password.
+
+        :param requests: iterable of MountRequests or (volume, password)
+        tuples
+        :param max_workers: maximum number of concurrent mounts
+
+        :rtype: BulkMountResult
+        """
+
+        # imported on first use, it's slow to import
+        from concurrent.futures import ThreadPoolExecutor
+
+        requests = [MountRequest(*request) for request in requests]
+
+        def mount(request):
+            start = time.perf_counter()
+            try:
+                self._mount_request(request)
+            except Exception as e:
+                return MountResult(request, e, time.perf_counter() - start)
+
+            return MountResult(request, elapsed=time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(mount, requests))
+
+        return BulkMountResult(results, time.perf_counter() - start)
+
+    def close(self):
+        """ Releases any resources held by the interface """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.close()
+
 
 class CryptInterface(BaseCryptInterface):
     """ Light wrapper over an interface, for dynamic switching """
@@ -29,5 +225,98 @@ class CryptInterface(BaseCryptInterface):
     def __init__(self, interface_class, *args, **kwargs):
         self.interface = interface_class(*args, **kwargs)
 
+    @classmethod
+    def from_backend(cls, name, *args, **kwargs):
+        """ Creates the interface over a backend resolved by name, e.g.
+        'veracrypt'. Only the modules of that backend are imported.
+
+        :param name: a name of BACKENDS or BACKEND_ALIASES
+        """
+
+        return cls(resolve_backend(name), *args, **kwargs)
+
     def get_mounted_volumes(self):
         return self.interface.get_mounted_volumes()
+
+    def get_volume_properties(self, *args, **kwargs):
+        return self.interface.get_volume_properties(*args, **kwargs)
+
+    def dismount_all(self, *args, **kwargs):
+        return self.interface.dismount_all(*args, **kwargs)
+
+    def poll_mounted_volumes(self, *args, **kwargs):
+        return self.interface.poll_mounted_volumes(*args, **kwargs)
+
+    def mount_volumes(self, *args, **kwargs):
+        return self.interface.mount_volumes(*args, **kwargs)
+
+    def close(self):
+        return self.interface.close()
+
+
+class CachedCryptInterface(CryptInterface):
+    """ CryptInterface which serves the mounted volumes from memory for
+    a limited time. Mounts and dismounts issued through it invalidate
+    the cache immediately.
+    """
+
+    def __init__(self, interface_class, *args, ttl=1.0, **kwargs):
+        """
+        :param interface_class: the wrapped interface class
+        :param ttl: number of seconds the mounted volumes are cached for
+        """
+
+        super().__init__(interface_class, *args, **kwargs)
+
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._volumes = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """ Drops the cached volumes """
+
+        with self._lock:
+            self._volumes = None
+
+    def get_mounted_volumes(self):
+        with self._lock:
+            if self._volumes is not None and \
+                    time.monotonic() < self._expires_at:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._volumes = self.interface.get_mounted_volumes()
+                self._expires_at = time.monotonic() + self.ttl
+
+            volumes = self._volumes
+
+        # hand out copies, so callers can't alter the cached volumes
+        return [copy.copy(volume) for volume in volumes]
+
+    def mount_volume(self, *args, **kwargs):
+        try:
+            return super().mount_volume(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def dismount_volume(self, *args, **kwargs):
+        try:
+            return super().dismount_volume(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def dismount_all(self, *args, **kwargs):
+        try:
+            return super().dismount_all(*args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def mount_volumes(self, *args, **kwargs):
+        try:
+            return super().mount_volumes(*args, **kwargs)
+        finally:
+            self.invalidate()
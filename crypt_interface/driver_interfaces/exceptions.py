@@ -1,2 +1,44 @@
 class DriverException(Exception):
     pass
+
+
+class DriverCallError(DriverException):
+    """ A call to the driver failed with an OS error code, e.g. a
+    DeviceIoControl call and its GetLastError() code
+    """
+
+    def __init__(self, message, code):
+        """
+        :param message: the error message
+        :param code: the numeric OS error code
+        """
+
+        super().__init__(message)
+        self.code = code
+
+
+class HandleOpenError(DriverCallError):
+    """ Opening a handle to the driver failed, e.g. with a sharing
+    violation while another process holds it
+    """
+
+
+class DriverReturnCodeError(DriverException):
+    """ The driver ran the call and returned an error code """
+
+    def __init__(self, message, code):
+        """
+        :param message: the error message
+        :param code: the numeric return code of the driver
+        """
+
+        super().__init__(message)
+        self.code = code
+
+
+class MountError(DriverReturnCodeError):
+    """ The driver failed to mount a volume """
+
+
+class DismountError(DriverReturnCodeError):
+    """ The driver failed to dismount a volume """
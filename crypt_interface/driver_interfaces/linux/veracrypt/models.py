@@ -0,0 +1,17 @@
+from crypt_interface.driver_interfaces.win.base_win_models import BaseVolume
+
+
+class LinuxVolume(BaseVolume):
+    """ Holds information about a volume mapped through device-mapper.
+    drive_no is the VeraCrypt slot, or an offset device-mapper minor number
+    for volumes opened by other tools.
+    """
+
+    __slots__ = ('dm_name', 'device', 'mount_point')
+
+    def __init__(self):
+        super().__init__()
+
+        self.dm_name = ''
+        self.device = ''
+        self.mount_point = ''
@@ -0,0 +1,274 @@
+import os
+import re
+import time
+from pathlib import Path
+
+from crypt_interface.driver_interfaces import base_crypt_interface
+from crypt_interface.driver_interfaces.exceptions import DriverException
+from crypt_interface.driver_interfaces.linux.veracrypt import models
+
+# device-mapper names of the VeraCrypt slots
+VERACRYPT_DM_NAME_PATTERN = re.compile(r'^veracrypt(\d+)$')
+
+# added to the device-mapper minor number to build the drive number of
+# dm-crypt volumes not opened by VeraCrypt, keeping them apart from slots
+DM_CRYPT_DRIVE_NO_OFFSET = 1 << 16
+
+# device-mapper uuid prefix of volumes opened through dm-crypt
+DM_CRYPT_UUID_PREFIX = 'CRYPT-'
+
+SECTOR_SIZE = 512
+
+
+def read_text(path, default=''):
+    """ Reads a sysfs/procfs attribute, stripped of the trailing newline """
+
+    try:
+        with open(str(path)) as file:
+            return file.read().strip()
+    except OSError:
+        return default
+
+
+def unescape_mountinfo(field):
+    """ Decodes the octal escapes (e.g. \\040 for space) of mountinfo """
+
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+
+def parse_mountinfo(text):
+    """ Maps the major:minor device numbers of mountinfo to mount points
+
+    :param text: content of /proc/<pid>/mountinfo
+    :return: dict of 'major:minor': mount point
+    """
+
+    mount_points = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 5:
+            continue
+
+        # keep the first mount of each device
+        mount_points.setdefault(fields[2], unescape_mountinfo(fields[4]))
+
+    return mount_points
+
+
+class LinuxVeraCryptInterface(base_crypt_interface.BaseCryptInterface):
+    """ Lists the mounted VeraCrypt/dm-crypt volumes by reading the
+    device-mapper state from sysfs and procfs, without spawning processes.
+    Mounting and dismounting go through the veracrypt CLI.
+    """
+
+    def __init__(self, root='/', cli='veracrypt', timeout=60,
+                 include_dm_crypt=True):
+        """
+        :param root: root of the sysfs/procfs tree, used to read a
+        fixture tree instead of the live system
+        :param cli: the veracrypt executable
+        :param timeout: seconds after which a CLI invocation is aborted
+        :param include_dm_crypt: if True, volumes opened through dm-crypt
+        by other tools are listed as well
+        """
+
+        self.root = Path(root)
+        self.cli = cli
+        self.timeout = timeout
+        self.include_dm_crypt = include_dm_crypt
+
+    def _read_volume(self, block_dir, mount_points):
+        """ Builds a LinuxVolume from a /sys/block/dm-* directory, or
+        returns None if it's not an encrypted volume
+        """
+
+        name = read_text(block_dir / 'dm' / 'name')
+        uuid = read_text(block_dir / 'dm' / 'uuid')
+
+        match = VERACRYPT_DM_NAME_PATTERN.match(name)
+        if not match and not (self.include_dm_crypt and
+                              uuid.startswith(DM_CRYPT_UUID_PREFIX)):
+            return
+
+        dev = read_text(block_dir / 'dev')
+
+        volume = models.LinuxVolume()
+        volume.is_mounted = True
+        volume.dm_name = name
+        volume.device = '/dev/mapper/{}'.format(name)
+        volume.volume_id = uuid.encode()
+        volume.disk_length = int(
+            read_text(block_dir / 'size', '0')) * SECTOR_SIZE
+        volume.mount_point = mount_points.get(dev, '')
+        volume.path = self._backing_path(block_dir)
+
+        if match:
+            volume.drive_no = int(match.group(1))
+        else:
+            volume.drive_no = DM_CRYPT_DRIVE_NO_OFFSET + int(
+                dev.partition(':')[2] or 0)
+
+        return volume
+
+    def _backing_path(self, block_dir):
+        """ Returns the container file or device behind a dm device """
+
+        try:
+            slaves = sorted(os.listdir(str(block_dir / 'slaves')))
+        except OSError:
+            return ''
+
+        if not slaves:
+            return ''
+
+        slave = slaves[0]
+        backing_file = read_text(
+            self.root / 'sys' / 'block' / slave / 'loop' / 'backing_file')
+
+        return backing_file or '/dev/{}'.format(slave)
+
+    def get_mounted_volumes(self):
+        mount_points = parse_mountinfo(
+            read_text(self.root / 'proc' / 'self' / 'mountinfo'))
+
+        volumes = []
+        for block_dir in sorted((self.root / 'sys' / 'block').glob('dm-*')):
+            volume = self._read_volume(block_dir, mount_points)
+            if volume is not None:
+                volumes.append(volume)
+
+        volumes.sort(key=lambda volume: volume.drive_no)
+        return volumes
+
+    def _mount_command(self, volume):
+        command = [self.cli, '--text', '--non-interactive', '--stdin']
+        if volume.drive_no is not None and \
+                volume.drive_no < DM_CRYPT_DRIVE_NO_OFFSET:
+            command.append('--slot={}'.format(volume.drive_no))
+
+        command.append(volume.path)
+        if volume.mount_point:
+            command.append(volume.mount_point)
+
+        return command
+
+    def _dismount_command(self, volume=None, ignore_open_files=False):
+        command = [self.cli, '--text', '--non-interactive', '--dismount']
+        if ignore_open_files:
+            command.append('--force')
+
+        if volume is not None:
+            command.append(volume.path or volume.mount_point)
+
+        return command
+
+    def _run_cli_batch(self, commands):
+        """ Starts all the CLI invocations at once and waits for them
+
+        :param commands: list of (arguments, stdin bytes) tuples
+        :return: list of (error message or None, elapsed seconds) tuples
+        """
+
+        # imported on first use, listing the volumes doesn't need it
+        import subprocess
+
+        started = []
+        for arguments, stdin in commands:
+            start = time.perf_counter()
+            try:
+                process = subprocess.Popen(
+                    arguments, stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except OSError as e:
+                started.append((None, stdin, start, str(e)))
+                continue
+
+            started.append((process, stdin, start, None))
+
+        results = []
+        deadline = time.monotonic() + self.timeout
+        for process, stdin, start, error in started:
+            if process is None:
+                results.append((error, time.perf_counter() - start))
+                continue
+
+            try:
+                _, stderr = process.communicate(
+                    stdin, timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                results.append(('timed out', time.perf_counter() - start))
+                continue
+
+            error = None
+            if process.returncode:
+                error = stderr.decode(errors='replace').strip() or \
+                    'exit code {}'.format(process.returncode)
+
+            results.append((error, time.perf_counter() - start))
+
+        return results
+
+    def mount_volume(self, volume, password):
+        (error, _), = self._run_cli_batch(
+            [(self._mount_command(volume), password + b'\n')])
+
+        if error:
+            raise DriverException(
+                'Mount volume "{}" failed: {}'.format(volume.path, error))
+
+    def mount_volumes(self, requests, max_workers=4):
+        requests = [base_crypt_interface.MountRequest(*request)
+                    for request in requests]
+
+        results = []
+        start = time.perf_counter()
+        for i in range(0, len(requests), max_workers):
+            batch = requests[i:i + max_workers]
+            outcomes = self._run_cli_batch([
+                (self._mount_command(request.volume),
+                 request.password + b'\n')
+                for request in batch])
+
+            for request, (error, elapsed) in zip(batch, outcomes):
+                if error:
+                    error = DriverException(
+                        'Mount volume "{}" failed: {}'.format(
+                            request.volume.path, error))
+                results.append(base_crypt_interface.MountResult(
+                    request, error, elapsed))
+
+        return base_crypt_interface.BulkMountResult(
+            results, time.perf_counter() - start)
+
+    def dismount_volume(self, volume, ignore_open_files=False):
+        self.dismount_volumes([volume], ignore_open_files)
+
+    def dismount_volumes(self, volumes, ignore_open_files=False):
+        """ Dismounts several volumes with one batch of CLI invocations
+
+        :param ignore_open_files: force the dismounts even if files are
+        opened on the volumes
+        :raises DriverException: listing all the failed dismounts
+        """
+
+        outcomes = self._run_cli_batch(
+            [(self._dismount_command(volume, ignore_open_files), b'')
+             for volume in volumes])
+
+        errors = ['"{}": {}'.format(volume.path or volume.mount_point, error)
+                  for volume, (error, _) in zip(volumes, outcomes) if error]
+
+        if errors:
+            raise DriverException(
+                'Dismount volume failed: {}'.format('; '.join(errors)))
+
+    def dismount_all(self, ignore_open_files=False):
+        (error, _), = self._run_cli_batch(
+            [(self._dismount_command(ignore_open_files=ignore_open_files),
+              b'')])
+
+        if error:
+            raise DriverException(
+                'Dismount all volumes failed: {}'.format(error))
@@ -0,0 +1,257 @@
+import threading
+import time
+
+
+def labels_key(labels):
+    """ Converts a labels dict to a hashable, ordered key """
+
+    return tuple(sorted(labels.items()))
+
+
+def error_label(val, enum_class):
+    """ Returns the name of an error code within an Enum, or the code
+    itself if it's unknown
+    """
+
+    try:
+        return enum_class(val).name
+    except ValueError:
+        return str(val)
+
+
+class Histogram(object):
+    """ HDR-style histogram of durations. Values are stored in log-linear
+    buckets, keeping a relative error bounded by the precision bits.
+    """
+
+    def __init__(self, precision_bits=5, unit=1e-9):
+        """
+        :param precision_bits: bits of precision kept within each power of
+        two, 5 bits keep the relative error under ~3%
+        :param unit: resolution of the recorded values, in seconds
+        """
+
+        self.precision_bits = precision_bits
+        self.unit = unit
+
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+        # bucket lower bound, in units: count
+        self._buckets = {}
+
+    def _bucket(self, units):
+        """ Returns the lower bound of the bucket holding a value """
+
+        shift = units.bit_length() - self.precision_bits
+        if shift <= 0:
+            return units
+
+        return (units >> shift) << shift
+
+    def record(self, value):
+        """ Records a duration, in seconds """
+
+        bucket = self._bucket(max(int(value / self.unit), 0))
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """ Returns the value below which a percentage of the recorded
+        values fall, in seconds
+
+        :param percent: number between 0 and 100
+        """
+
+        if not self.count:
+            return 0.0
+
+        threshold = self.count * percent / 100.0
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= threshold:
+                return min(bucket * self.unit, self.max)
+
+        return self.max
+
+
+class MetricsSink(object):
+    """ Abstract destination of the driver calls metrics """
+
+    def observe(self, name, value, **labels):
+        """ Records a duration, in seconds """
+
+        raise NotImplementedError
+
+    def increment(self, name, amount=1, **labels):
+        """ Increments a counter """
+
+        raise NotImplementedError
+
+    def timed(self, name, **labels):
+        """ Returns a context manager which observes its duration """
+
+        return Timer(self, name, labels)
+
+
+class Timer(object):
+    """ Context manager observing its duration into a sink """
+
+    __slots__ = ('sink', 'name', 'labels', 'start')
+
+    def __init__(self, sink, name, labels):
+        self.sink = sink
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.sink.observe(
+            self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class NullTimer(object):
+    """ Context manager doing nothing """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class NullSink(MetricsSink):
+    """ Sink discarding all metrics, used when metrics are disabled """
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def increment(self, name, amount=1, **labels):
+        pass
+
+    def timed(self, name, **labels):
+        return NULL_TIMER
+
+
+NULL_SINK = NullSink()
+
+
+class InMemorySink(MetricsSink):
+    """ Sink keeping histograms and counters in memory """
+
+    def __init__(self, precision_bits=5):
+        self.precision_bits = precision_bits
+
+        # name: {labels key: Histogram}
+        self.histograms = {}
+        # name: {labels key: value}
+        self.counters = {}
+
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = labels_key(labels)
+        with self._lock:
+            histograms = self.histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.precision_bits)
+            histogram.record(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = labels_key(labels)
+        with self._lock:
+            counters = self.counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + amount
+
+    def histogram(self, name, **labels):
+        """ Returns the histogram of a metric, or None """
+
+        return self.histograms.get(name, {}).get(labels_key(labels))
+
+    def counter(self, name, **labels):
+        """ Returns the value of a counter """
+
+        return self.counters.get(name, {}).get(labels_key(labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+
+class PrometheusExporter(object):
+    """ Renders an InMemorySink in the Prometheus text exposition format.
+    Histograms are exported as summaries.
+    """
+
+    quantiles = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, sink, prefix='crypt_interface_'):
+        self.sink = sink
+        self.prefix = prefix
+
+    @staticmethod
+    def _format_labels(key, **extra):
+        labels = list(key) + sorted(extra.items())
+        if not labels:
+            return ''
+
+        return '{{{}}}'.format(','.join(
+            '{}="{}"'.format(name, str(value).replace('"', '\\"'))
+            for name, value in labels))
+
+    def export(self):
+        """ Returns the metrics as Prometheus text """
+
+        lines = []
+
+        with self.sink._lock:
+            histograms = {name: dict(items)
+                          for name, items in self.sink.histograms.items()}
+            counters = {name: dict(items)
+                        for name, items in self.sink.counters.items()}
+
+        for name in sorted(histograms):
+            metric = self.prefix + name
+            lines.append('# TYPE {} summary'.format(metric))
+            for key, histogram in sorted(histograms[name].items()):
+                for quantile in self.quantiles:
+                    lines.append('{}{} {!r}'.format(
+                        metric, self._format_labels(key, quantile=quantile),
+                        histogram.percentile(quantile * 100)))
+                lines.append('{}_sum{} {!r}'.format(
+                    metric, self._format_labels(key), histogram.total))
+                lines.append('{}_count{} {}'.format(
+                    metric, self._format_labels(key), histogram.count))
+
+        for name in sorted(counters):
+            metric = self.prefix + name
+            lines.append('# TYPE {} counter'.format(metric))
+            for key, value in sorted(counters[name].items()):
+                lines.append('{}{} {}'.format(
+                    metric, self._format_labels(key), value))
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+
+from crypt_interface.driver_interfaces import metrics
+from crypt_interface.driver_interfaces.exceptions import DriverException
+
+
+class RetryRule(object):
+    """ Matches the transient errors of a class, optionally restricted to
+    some error codes, and sets how many times they may be retried
+    """
+
+    def __init__(self, name, error_class, codes=None, budget=3):
+        """
+        :param name: the error class name, used in metrics
+        :param error_class: the matched DriverException subclass
+        :param codes: the matched values of the exception code attribute,
+        any code matches if not set
+        :param budget: maximum number of retries of a call for these errors
+        """
+
+        self.name = name
+        self.error_class = error_class
+        self.codes = frozenset(codes) if codes is not None else None
+        self.budget = budget
+
+    def matches(self, error):
+        if not isinstance(error, self.error_class):
+            return False
+
+        return self.codes is None or \
+            getattr(error, 'code', None) in self.codes
+
+    def __repr__(self):
+        return '<{}: {} x{}>'.format(
+            self.__class__.__name__, self.name, self.budget)
+
+    __str__ = __repr__
+
+
+class RetryPolicy(object):
+    """ Retries the calls failing with transient errors, waiting with a
+    jittered exponential backoff. Each error class has its own budget of
+    retries and all the retries of a call must fit in an overall deadline.
+
+    Retries of concurrent calls can be limited, so a burst of failing calls
+    queues up instead of hammering the driver.
+    """
+
+    def __init__(self, rules=(), base_delay=0.005, max_delay=0.5,
+                 multiplier=2.0, deadline=10.0, max_concurrent_retries=None,
+                 metrics_sink=None, sleep=time.sleep, rng=None):
+        """
+        :param rules: iterable of RetryRules, the first matching rule of an
+        error applies
+        :param base_delay: seconds of the first backoff
+        :param max_delay: maximum seconds of a backoff
+        :param multiplier: growth of the backoff after each retry
+        :param deadline: seconds after the first attempt past which no retry
+        is started, unlimited if None
+        :param max_concurrent_retries: maximum number of retries running at
+        once across all calls, unlimited if None
+        :param metrics_sink: metrics.MetricsSink receiving the retry
+        counters, metrics are disabled if not set
+        :param sleep: the function waiting for the backoffs
+        :param rng: random.Random drawing the jitter
+        """
+
+        self.rules = list(rules)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline
+        self.metrics = metrics_sink or metrics.NULL_SINK
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+        self._retry_slots = None
+        if max_concurrent_retries is not None:
+            self._retry_slots = threading.BoundedSemaphore(
+                max_concurrent_retries)
+
+    def match(self, error):
+        """ Returns the RetryRule matching an error, or None """
+
+        for rule in self.rules:
+            if rule.matches(error):
+                return rule
+
+    def backoff(self, retry):
+        """ Returns the seconds to wait before a retry, drawn uniformly up to
+        the exponential backoff ("full jitter"), which spreads the retries of
+        calls failing together
+
+        :param retry: number of retries already made by the call
+        """
+
+        ceiling = min(self.max_delay,
+                      self.base_delay * self.multiplier ** retry)
+        return self.rng.uniform(0, ceiling)
+
+    def call(self, func, *args, operation='call', **kwargs):
+        """ Calls a function, retrying it on the errors matched by the rules.
+        When the budget or the deadline runs out, the last error is raised.
+
+        :param operation: the operation name, used in metrics
+        """
+
+        start = time.monotonic()
+        retries = {}
+        retry = 0
+        last_error = None
+
+        while True:
+            # the slots are only taken by retries, first attempts run freely
+            throttled = retry and self._retry_slots is not None
+            if throttled and not self._acquire_slot(start):
+                self.metrics.increment(
+                    'retries_exhausted_total', operation=operation,
+                    error=self.match(last_error).name, reason='deadline')
+                raise last_error
+
+            try:
+                return func(*args, **kwargs)
+            except DriverException as e:
+                last_error = e
+                rule = self.match(e)
+                if rule is None:
+                    raise
+
+                used = retries.get(rule.name, 0)
+                if used >= rule.budget:
+                    self.metrics.increment(
+                        'retries_exhausted_total', operation=operation,
+                        error=rule.name, reason='budget')
+                    raise
+
+                delay = self.backoff(retry)
+                if self.deadline is not None and \
+                        time.monotonic() - start + delay > self.deadline:
+                    self.metrics.increment(
+                        'retries_exhausted_total', operation=operation,
+                        error=rule.name, reason='deadline')
+                    raise
+            finally:
+                if throttled:
+                    self._retry_slots.release()
+
+            retries[rule.name] = used + 1
+            retry += 1
+            self.metrics.increment(
+                'retries_total', operation=operation, error=rule.name)
+            self.sleep(delay)
+
+    def _acquire_slot(self, start):
+        """ Waits for a retry slot until the deadline, returns False if none
+        was freed in time
+        """
+
+        if self.deadline is None:
+            return self._retry_slots.acquire()
+
+        timeout = self.deadline - (time.monotonic() - start)
+        return timeout > 0 and self._retry_slots.acquire(timeout=timeout)
+
+
+# policy which never retries
+NO_RETRY = RetryPolicy()
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+
+from crypt_interface.driver_interfaces import base_constants
+
+
+class VolumeEventType(base_constants.PrintableEnum):
+    ADDED = 1
+    REMOVED = 2
+    CHANGED = 3
+
+
+class VolumeEvent(object):
+    """ Describes a change of the mounted volumes """
+
+    def __init__(self, event_type, volume, previous=None):
+        """
+        :param event_type: member of VolumeEventType
+        :param volume: the added/changed volume, or the removed one
+        :param previous: for CHANGED events, the volume before the change
+        """
+
+        self.type = event_type
+        self.volume = volume
+        self.previous = previous
+
+    @property
+    def drive_no(self):
+        return self.volume.drive_no
+
+    @property
+    def volume_id(self):
+        return self.volume.volume_id
+
+    def __repr__(self):
+        return '<{}: {} {} {}>'.format(
+            self.__class__.__name__, self.type, self.drive_no,
+            self.volume.path)
+
+    __str__ = __repr__
+
+
+def diff_volumes(previous, current):
+    """ Computes the events between two snapshots of mounted volumes
+
+    :param previous: dict of drive number: volume
+    :param current: dict of drive number: volume
+
+    :rtype: List[VolumeEvent]
+    """
+
+    events = []
+
+    for drive_no in sorted(previous.keys() | current.keys()):
+        old = previous.get(drive_no)
+        new = current.get(drive_no)
+
+        if old is not None and new is not None:
+            # the same volume is still mounted on the drive
+            if old.volume_id == new.volume_id:
+                if old.to_dict() != new.to_dict():
+                    events.append(VolumeEvent(
+                        VolumeEventType.CHANGED, new, previous=old))
+                continue
+
+        if old is not None:
+            events.append(VolumeEvent(VolumeEventType.REMOVED, old))
+
+        if new is not None:
+            events.append(VolumeEvent(VolumeEventType.ADDED, new))
+
+    return events
+
+
+class VolumeWatcher(object):
+    """ Polls an interface for changes of the mounted volumes.
+
+    The mounted drives bitmask is used to skip decoding the volumes when
+    nothing was mounted or dismounted. The polling interval grows while
+    nothing changes and goes back to the minimum after a change.
+    """
+
+    def __init__(self, interface, min_interval=0.25, max_interval=5.0,
+                 backoff=2.0, full_scan_every=10, emit_initial=False):
+        """
+        :param interface: the crypt interface to be polled
+        :param min_interval: polling interval after a change, in seconds
+        :param max_interval: maximum polling interval, in seconds
+        :param backoff: factor applied to the interval after an idle poll
+        :param full_scan_every: number of polls after which the volumes are
+        decoded even if the bitmask didn't change, to catch changes of the
+        volumes themselves
+        :param emit_initial: if True, the volumes mounted when the watcher
+        starts are reported as ADDED events
+        """
+
+        self.interface = interface
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.full_scan_every = full_scan_every
+        self.emit_initial = emit_initial
+
+        self.interval = min_interval
+
+        self._mounted_drives = None
+        self._volumes = None
+        self._polls_since_scan = 0
+        self._stopped = threading.Event()
+
+    def poll(self):
+        """ Polls the interface once and adapts the polling interval
+
+        :rtype: List[VolumeEvent]
+        """
+
+        # counted before the check, so every full_scan_every-th poll scans
+        self._polls_since_scan += 1
+
+        mounted_drives = self._mounted_drives
+        if self._polls_since_scan >= self.full_scan_every:
+            mounted_drives = None
+
+        mask, volumes = self.interface.poll_mounted_volumes(mounted_drives)
+        self._mounted_drives = mask
+
+        events = []
+        if volumes is not None:
+            self._polls_since_scan = 0
+
+            current = {volume.drive_no: volume for volume in volumes}
+            if self._volumes is not None or self.emit_initial:
+                events = diff_volumes(self._volumes or {}, current)
+
+            self._volumes = current
+
+        if events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff,
+                                self.max_interval)
+
+        return events
+
+    def stop(self):
+        """ Stops the watch loops """
+
+        self._stopped.set()
+
+    def watch(self):
+        """ Generator yielding VolumeEvents until stop() is called """
+
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            yield from self.poll()
+            self._stopped.wait(self.interval)
+
+    __iter__ = watch
+
+    async def watch_async(self):
+        """ Async generator yielding VolumeEvents until stop() is called.
+        The interface is polled on the default executor.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            for event in await loop.run_in_executor(None, self.poll):
+                yield event
+            await asyncio.sleep(self.interval)
+
+    __aiter__ = watch_async
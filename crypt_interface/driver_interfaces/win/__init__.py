@@ -1,9 +1,19 @@
 """
 Initial inspiration for CreateFile and DeviceIOControl interfacing from:
     https://gist.github.com/santa4nt/11068180
+
+The submodules are imported on first access, so importing the package
+doesn't build any ctypes struct class or touch the Windows bindings.
 """
 
-from crypt_interface.driver_interfaces.win import (
-    win_constants, base_win_models, base_win_driver_models)
+import importlib
+
+__all__ = ['win_constants', 'base_win_models', 'base_win_driver_models']
+
+
+def __getattr__(name):
+    if name not in __all__:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
 
-__all__ = [win_constants, base_win_models, base_win_driver_models]
+    return importlib.import_module('{}.{}'.format(__name__, name))
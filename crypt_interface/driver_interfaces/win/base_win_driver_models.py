@@ -1,10 +1,42 @@
-import array
 import ctypes
-from functools import partialmethod
+import operator
+import re
+import threading
+from enum import Enum
+from functools import lru_cache, partialmethod
 
 from crypt_interface.driver_interfaces.exceptions import DriverException
 
 
+# continuous runs of non-zero bytes
+STRAY_BYTES_PATTERN = re.compile(b'[^\x00]+')
+
+
+class IntegrityLevel(Enum):
+    """ How thoroughly the excess buffer of a struct is checked """
+
+    # no check at all
+    OFF = 0
+    # single all-zero comparison of the whole excess buffer
+    FAST = 1
+    # collects every run of stray bytes and reports them
+    FORENSIC = 2
+
+
+@lru_cache(maxsize=None)
+def zero_bytes(size):
+    """ Returns a cached zero filled bytes object of the given size """
+
+    return bytes(size)
+
+
+@lru_cache(maxsize=None)
+def enum_table(enum_class):
+    """ Returns a cached value to member lookup table of an Enum class """
+
+    return {member.value: member for member in enum_class}
+
+
 class PConverters(object):
     """ Provides converters from C/C++/Win types to Python types """
 
@@ -14,6 +46,15 @@ class PConverters(object):
 
         return val.value
 
+    @staticmethod
+    def path(val):
+        """ Unicode string to a file path, without the NT prefix """
+
+        if val.startswith('\\??\\'):
+            val = val[4:]
+
+        return val
+
     @staticmethod
     def wchar_array_path(val):
         """ WChar[] to unicode string containing a file path """
@@ -30,6 +71,25 @@ class PConverters(object):
 
         return bytes(val.value, encoding=encoding, errors=errors)
 
+    @staticmethod
+    def ubyte_array_bytes(val):
+        """ c_ubyte[] to bytes """
+
+        return bytes(val)
+
+    @staticmethod
+    def buffer_bytes(size):
+        """ Builds a converter returning the first size raw bytes of a
+        buffer (ctypes array, memoryview), without decoding them
+
+        :param size: number of bytes kept
+        """
+
+        def converter(val):
+            return memoryview(val).cast('B')[:size].tobytes()
+
+        return converter
+
     @staticmethod
     def win_bool(val):
         """ wintypes.BOOL to bool """
@@ -40,12 +100,22 @@ class PConverters(object):
     def enum_converter(val, enum_class):
         """ c_int to Enum """
 
-        try:
-            output = enum_class(val)
-        except ValueError:
-            output = val
+        return enum_table(enum_class).get(val, val)
 
-        return output
+    @staticmethod
+    def enum_lookup(enum_class):
+        """ Builds a dict based c_int to Enum converter. Unknown values
+        are returned unchanged.
+
+        :param enum_class: the Enum subclass
+        """
+
+        table = enum_table(enum_class)
+
+        def converter(val):
+            return table.get(val, val)
+
+        return converter
 
     # WChar[] to utf-16 bytes
     wchar_utf16_byte_array = partialmethod(wchar_byte_array, encoding='utf-16')
@@ -55,6 +125,33 @@ class PConverters(object):
         wchar_utf16_byte_array, errors='surrogatepass')
 
 
+def writable_buffer(val):
+    """ Returns a c_char array sharing the memory of a writable bytes-like
+    object (e.g. bytearray), or None if the object is read-only
+    """
+
+    view = memoryview(val)
+    if view.readonly:
+        return None
+
+    view = view.cast('B')
+    return (ctypes.c_char * view.nbytes).from_buffer(view)
+
+
+def wipe(val):
+    """ Zeroes a ctypes instance or a writable bytes-like object in place.
+    Immutable objects, e.g. bytes, can't be wiped and are left untouched.
+    """
+
+    if isinstance(val, (ctypes.Structure, ctypes.Array)):
+        ctypes.memset(ctypes.addressof(val), 0, ctypes.sizeof(val))
+        return
+
+    buffer = writable_buffer(val)
+    if buffer is not None:
+        ctypes.memset(buffer, 0, len(buffer))
+
+
 class CConverters(object):
     """ Provides converters from Python to C/C++/Win types """
     @staticmethod
@@ -64,6 +161,31 @@ class CConverters(object):
         return (ctypes.c_ubyte * size).from_buffer_copy(
             val + bytes(size - len(val)))
 
+    @staticmethod
+    def copy_into(val, destination):
+        """ Copies bytes or a bytes-like object into a ctypes array with a
+        single memmove, leaving the rest of the array untouched
+
+        :param val: bytes, bytearray, memoryview or other buffer
+        :param destination: the ctypes array written to
+        :return: number of bytes copied
+        """
+
+        view = memoryview(val)
+        size = view.nbytes
+        if size > ctypes.sizeof(destination):
+            raise ValueError('{} bytes do not fit in {} bytes'.format(
+                size, ctypes.sizeof(destination)))
+
+        if isinstance(val, bytes):
+            source = val
+        else:
+            # read-only buffers other than bytes (rare) need a copy
+            source = writable_buffer(view) or view.tobytes()
+
+        ctypes.memmove(destination, source, size)
+        return size
+
 
 class Field(object):
     """ Defines a Field for conversions to/from Python objects
@@ -71,13 +193,15 @@ class Field(object):
     """
 
     def __init__(self, name, alias, field_type, is_indexed=False,
-                 converter=lambda x: x):
+                 converter=lambda x: x, raw=False):
         """
         :param name: Struct name of the field
         :param alias: Python instance name of the field
         :param field_type: ctypes type of the field
         :param is_indexed: if True, it will be treated as an array
         :param converter: function to convert field to a Python type
+        :param raw: if True, the compiled codec passes the converter a
+        byte memoryview over the value instead of a ctypes object
         """
 
         self.type = field_type
@@ -85,6 +209,7 @@ class Field(object):
         self.name = name
         self.converter = converter
         self.is_indexed = is_indexed
+        self.raw = raw
 
     def to_struct_field(self):
         """ Returns a ctypes.Structure field definition """
@@ -152,8 +277,284 @@ class Field(object):
         return fields
 
 
+class StructArena(object):
+    """ Keeps one preallocated instance per struct type and per thread,
+    so repeated driver calls don't allocate new structs
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+        # (thread, instances) of every thread which used the arena, so
+        # clear() reaches the instances of all threads
+        self._registry = []
+        self._lock = threading.Lock()
+
+    def _register(self):
+        """ Creates and registers the instances dict of the current thread,
+        dropping the ones of the threads which exited
+        """
+
+        instances = self._local.instances = {}
+        thread = threading.current_thread()
+
+        with self._lock:
+            exited = [owned for owner, owned in self._registry
+                      if not owner.is_alive()]
+            self._registry = [
+                (owner, owned) for owner, owned in self._registry
+                if owner.is_alive()]
+            self._registry.append((thread, instances))
+
+        for owned in exited:
+            self._wipe(owned)
+
+        return instances
+
+    @staticmethod
+    def _wipe(instances):
+        """ Zeroes and drops the instances of a thread """
+
+        for struct in instances.values():
+            ctypes.memset(ctypes.addressof(struct), 0, ctypes.sizeof(struct))
+
+        instances.clear()
+
+    def get(self, struct_class):
+        """ Returns the zeroed instance of a struct type owned by the
+        current thread
+
+        :param struct_class: the ctypes.Structure subclass
+        """
+
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._register()
+
+        struct = instances.get(struct_class)
+        if struct is None:
+            struct = instances[struct_class] = struct_class()
+        else:
+            ctypes.memset(ctypes.addressof(struct), 0, ctypes.sizeof(struct))
+            struct._processed_buffer = None
+
+        return struct
+
+    def clear(self):
+        """ Zeroes and drops the instances of all threads. It must not run
+        while driver calls are using the arena.
+        """
+
+        with self._lock:
+            registry = self._registry
+            self._registry = []
+            self._local = threading.local()
+
+        for _, instances in registry:
+            self._wipe(instances)
+
+
+class ScalarColumn(object):
+    """ Column which returns the same value for every index """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __getitem__(self, index):
+        return self.value
+
+
+class SlotColumn(object):
+    """ Column of byte memoryviews over the elements of an array field """
+
+    __slots__ = ('view', 'start', 'stride')
+
+    def __init__(self, view, start, stride):
+        self.view = view
+        self.start = start
+        self.stride = stride
+
+    def __getitem__(self, index):
+        start = self.start + index * self.stride
+        return self.view[start:start + self.stride]
+
+
+class CodecPlan(object):
+    """ Precompiled conversions between a struct class and Python objects.
+    Field descriptors, offsets and converters are resolved once, when the
+    struct class is created.
+    """
+
+    # memoryview formats used to read numeric array fields as columns
+    column_formats = frozenset('bBhHiIlLqQfd?')
+
+    def __init__(self, struct_class, fields):
+        """
+        :param struct_class: the ctypes.Structure subclass
+        :param fields: the Fields of the struct class
+        """
+
+        self.struct_class = struct_class
+        self.fields = [field for field in fields
+                       if not field.alias.startswith('_')]
+
+        self._converters = {
+            field.alias: field.converter for field in self.fields}
+        self._readers = {}
+        self._getters = {}
+        self._setters = {}
+        for field in self.fields:
+            descriptor = getattr(struct_class, field.name)
+            self._readers[field.alias] = self._compile_reader(
+                field, descriptor)
+
+            if not field.is_indexed:
+                self._getters[field.alias] = (
+                    descriptor.__get__, field.converter)
+                self._setters[field.alias] = descriptor.__set__
+
+        self._targets = {}
+        self._encoders = {}
+        self._updaters = {}
+
+    def _compile_reader(self, field, descriptor):
+        """ Builds a function which returns an indexable column with the raw
+        values of a field, given the struct and a byte memoryview over it
+        """
+
+        start = descriptor.offset
+        stop = start + descriptor.size
+
+        if field.raw:
+            if not field.is_indexed:
+                return lambda struct, view: ScalarColumn(view[start:stop])
+
+            stride = ctypes.sizeof(field.type._type_)
+            return lambda struct, view: SlotColumn(view, start, stride)
+
+        if not field.is_indexed:
+            return lambda struct, view: ScalarColumn(
+                descriptor.__get__(struct))
+
+        fmt = getattr(field.type._type_, '_type_', None)
+        if isinstance(fmt, str) and fmt in self.column_formats:
+            return lambda struct, view: view[start:stop].cast(fmt)
+
+        return lambda struct, view: descriptor.__get__(struct)
+
+    def _target_fields(self, factory):
+        """ Returns the fields defined on the objects built by factory """
+
+        fields = self._targets.get(factory)
+        if fields is None:
+            probe = factory()
+            fields = self._targets[factory] = [
+                (field.alias, self._readers[field.alias], field.converter)
+                for field in self.fields if hasattr(probe, field.alias)]
+
+        return fields
+
+    def read_columns(self, struct, aliases):
+        """ Returns indexable columns with the raw, unconverted values of
+        fields. Numeric array fields are memoryviews over the struct.
+
+        :param struct: the struct from which the values are retrieved
+        :param aliases: tuple of the field aliases to read
+        """
+
+        view = memoryview(struct).cast('B')
+        return [self._readers[alias](struct, view) for alias in aliases]
+
+    def decode_columns(self, struct, indices, aliases):
+        """ Returns, for each field, the list of its converted values at
+        the given indices
+
+        :param struct: the struct from which the values are retrieved
+        :param indices: list of indices within the array fields
+        :param aliases: tuple of the field aliases to decode
+        """
+
+        return [[self._converters[alias](column[index]) for index in indices]
+                for alias, column in zip(aliases, self.read_columns(
+                    struct, aliases))]
+
+    def decode_slots(self, struct, indices, factory):
+        """ Builds one object per index, filled with the converted values
+        of the corresponding struct array elements. Only the attributes
+        already defined on the built objects are filled.
+
+        :param struct: the struct from which the values are retrieved
+        :param indices: iterable of indices within the array fields
+        :param factory: callable returning an empty object
+
+        :return: list of objects
+        """
+
+        view = memoryview(struct).cast('B')
+        columns = [
+            (alias, reader(struct, view), converter)
+            for alias, reader, converter in self._target_fields(factory)]
+
+        objects = []
+        for index in indices:
+            obj = factory()
+            for alias, column, converter in columns:
+                setattr(obj, alias, converter(column[index]))
+            objects.append(obj)
+
+        return objects
+
+    def encode(self, obj, struct, aliases):
+        """ Copies attributes of an object into the struct fields
+
+        :param obj: the instance from which the values are retrieved
+        :param struct: the struct to be modified
+        :param aliases: tuple of the non-indexed field aliases to copy
+        """
+
+        encoders = self._encoders.get(aliases)
+        if encoders is None:
+            encoders = self._encoders[aliases] = [
+                (operator.attrgetter(alias), self._setters[alias])
+                for alias in aliases]
+
+        for getter, setter in encoders:
+            setter(struct, getter(obj))
+
+    def update(self, obj, struct, aliases):
+        """ Copies the converted values of struct fields into the
+        attributes of an object
+
+        :param obj: the instance to be modified
+        :param struct: the struct from which the values are retrieved
+        :param aliases: tuple of the non-indexed field aliases to copy
+        """
+
+        updaters = self._updaters.get(aliases)
+        if updaters is None:
+            updaters = self._updaters[aliases] = [
+                (alias,) + self._getters[alias] for alias in aliases]
+
+        for alias, getter, converter in updaters:
+            setattr(obj, alias, converter(getter(struct)))
+
+
+class BaseStructType(type(ctypes.Structure)):
+    """ Metaclass which compiles the CodecPlan of every struct class
+    defining its fields
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+
+        if '_fields_' in namespace:
+            cls.codec = CodecPlan(cls, cls.field_list)
+
+
 # noinspection PyTypeChecker
-class BaseStruct(ctypes.Structure):
+class BaseStruct(ctypes.Structure, metaclass=BaseStructType):
     """ Base Struct for all Crypt Structs """
 
     base_fields = [
@@ -164,52 +565,122 @@ class BaseStruct(ctypes.Structure):
 
     field_list = []
 
+    # compiled by BaseStructType for every struct class
+    codec = None
+
+    # default level used by check_excess_buffer
+    integrity_level = IntegrityLevel.FAST
+
     def __init__(self, *args, **kwargs):
         self._processed_buffer = None
 
         super().__init__(*args, **kwargs)
 
-    def check_excess_buffer(self):
+    def excess_buffer_view(self):
+        """ Returns a byte memoryview over the excess buffer, or None
+        if the struct doesn't define it
+        """
+
+        field = getattr(type(self), '_buffer', None)
+        if field is None:
+            return
+
+        return memoryview(self).cast('B')[
+            field.offset:field.offset + field.size]
+
+    def check_excess_buffer(self, integrity_level=None):
         """ Checks the excess buffer for stray bytes. This happens when
         the struct is not aligned.
+
+        :param integrity_level: member of IntegrityLevel, defaults to
+        the integrity_level of the struct
         """
 
+        if integrity_level is None:
+            integrity_level = self.integrity_level
+
+        if integrity_level is IntegrityLevel.OFF:
+            return
+
         # if the struct doesn't define the buffer, abort check
-        if not getattr(self, '_buffer', None):
+        view = self.excess_buffer_view()
+        if view is None:
             return
 
-        buffers = []
-        aux = []
-        pos = -1
-
-        # a bit more processing for debugging purposes
-        # todo: add a DEBUG config and condition the debug-only code
-        # store continuous bytes as separate (position, bytes) tuples
-        for i in range(len(self._buffer)):
-            b = self._buffer[i]
-            if b:
-                if not aux:
-                    pos = i
-                aux.append(b)
-            else:
-                if not len(aux):
-                    continue
-
-                buffers.append((pos, aux))
-                aux = []
-
-        self._processed_buffer = {}
-
-        # convert to a nice dict
-        for i in range(len(buffers)):
-            pos = buffers[i][0]
-            buffer = array.array('B', buffers[i][1]).tostring()
-            self._processed_buffer[pos] = buffer
-
-        if self._processed_buffer:
-            # todo: expose more info here when debugging
-            raise DriverException(
-                '{}:{} Excess buffer contains data. '
-                'Struct is not aligned.'.format(
-                    self.__class__.__name__,
-                    self.check_excess_buffer.__name__))
+        # compared in place, the buffer is only copied to report stray bytes.
+        # memoryview == bytes unpacks item by item, startswith is a memcmp
+        if zero_bytes(len(view)).startswith(view):
+            return
+
+        message = '{}:{} Excess buffer contains data. ' \
+                  'Struct is not aligned.'.format(
+                      self.__class__.__name__,
+                      self.check_excess_buffer.__name__)
+
+        if integrity_level is IntegrityLevel.FORENSIC:
+            # store continuous bytes as separate position: bytes items
+            self._processed_buffer = {
+                match.start(): match.group()
+                for match in STRAY_BYTES_PATTERN.finditer(view.tobytes())}
+
+            message += ' Stray bytes: {}'.format(', '.join(
+                '{}: {}'.format(pos, buffer.hex())
+                for pos, buffer in self._processed_buffer.items()))
+
+        raise DriverException(message)
+
+
+@lru_cache(maxsize=None)
+def unguarded_struct(struct_class):
+    """ Builds a variant of a struct class without the excess buffer, for
+    drivers whose layout is known to match. The variant is a prefix of the
+    original class, so buffers of either class can be read as the other.
+
+    :param struct_class: the BaseStruct subclass
+    :raises DriverException: if the excess buffer is not the last field
+    """
+
+    field_list = [field for field in struct_class.field_list
+                  if field.name != '_buffer']
+
+    if len(field_list) == len(struct_class.field_list):
+        return struct_class
+
+    if struct_class.field_list[-1].name != '_buffer':
+        raise DriverException(
+            '{}: the excess buffer is not the last field'.format(
+                struct_class.__name__))
+
+    variant = type(struct_class)(struct_class.__name__, (BaseStruct,), {
+        '__doc__': struct_class.__doc__,
+        '__module__': struct_class.__module__,
+        'field_list': field_list,
+        '_fields_': Field.iterable_to_struct_fields(field_list),
+    })
+
+    return variant
+
+
+def check_struct_layout(struct_class, size, offsets):
+    """ Checks the size and field offsets of a struct class against the ones
+    of the driver headers
+
+    :param struct_class: the BaseStruct subclass
+    :param size: the expected sizeof of the class
+    :param offsets: dict of field name: expected offset
+    :raises DriverException: listing the mismatches
+    """
+
+    mismatches = []
+    if ctypes.sizeof(struct_class) != size:
+        mismatches.append('sizeof {} != {}'.format(
+            ctypes.sizeof(struct_class), size))
+
+    for name, offset in offsets.items():
+        actual = getattr(struct_class, name).offset
+        if actual != offset:
+            mismatches.append('{} at {} != {}'.format(name, actual, offset))
+
+    if mismatches:
+        raise DriverException('{}: layout differs from the driver: {}'.format(
+            struct_class.__name__, ', '.join(mismatches)))
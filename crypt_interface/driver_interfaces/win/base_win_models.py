@@ -1,5 +1,38 @@
+from functools import lru_cache
+
+
+def drive_numbers_from_mask(mask):
+    """ Yields the drive numbers of the set bits of a drive letters bitmask
+    (bit 0 is A:, bit 1 is B:, etc.)
+
+    :param mask: the bitmask
+    """
+
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+@lru_cache(maxsize=None)
+def slot_names(cls):
+    """ Returns the __slots__ names of a class and its bases, base first """
+
+    names = []
+    for klass in reversed(cls.__mro__):
+        names.extend(getattr(klass, '__slots__', ()))
+
+    return tuple(names)
+
+
 class BaseVolume(object):
-    """ Holds information about an encrypted BaseVolume """
+    """ Holds information about an encrypted BaseVolume. Attributes are
+    stored in __slots__, subclasses must declare their own.
+    """
+
+    __slots__ = ('is_mounted', 'path', 'label', 'volume_id', 'disk_length',
+                 'enc_algorithm', 'volume_type', 'truecrypt_mode',
+                 'drive_no')
 
     def __init__(self):
         self.is_mounted = False
@@ -10,8 +43,15 @@ class BaseVolume(object):
         self.enc_algorithm = 0
         self.volume_type = 0
         self.truecrypt_mode = False
+        self.drive_no = None
+
+    def to_dict(self):
+        """ Returns the volume attributes as a dict """
+
+        return {name: getattr(self, name)
+                for name in slot_names(type(self))}
 
     def __repr__(self):
-        return '<{}: {}>'.format(self.__class__.__name__, self.__dict__)
+        return '<{}: {}>'.format(self.__class__.__name__, self.to_dict())
 
     __str__ = __repr__
@@ -0,0 +1,176 @@
+import threading
+
+from crypt_interface.driver_interfaces.exceptions import DriverException
+from crypt_interface.driver_interfaces.win import win_constants
+
+# drive letters tried by default, from Z: down, away from the letters
+# Windows assigns to new disks and removable drives
+DEFAULT_ORDER = tuple(range(win_constants.MAX_VOLUMES - 1, -1, -1))
+
+# floppy drive letters, never allocated by default
+DEFAULT_EXCLUDED = 'AB'
+
+
+def drive_numbers(drives):
+    """ Converts drive letters and/or drive numbers to drive numbers
+
+    :param drives: iterable of letters (e.g. 'XYZ', 'X:' or ['X:', 'Y']) or
+    of drive numbers
+    """
+
+    if drives is None:
+        return []
+
+    # a string holds letters, the colons of e.g. 'X:' aren't drives
+    if isinstance(drives, str):
+        drives = drives.replace(':', '')
+
+    numbers = []
+    for drive in drives:
+        if isinstance(drive, str):
+            letter = drive[:1].upper()
+            if not 'A' <= letter <= 'Z':
+                raise ValueError('Invalid drive letter: {!r}'.format(drive))
+
+            drive = ord(letter) - ord('A')
+
+        if not 0 <= drive < win_constants.MAX_VOLUMES:
+            raise ValueError('Invalid drive: {!r}'.format(drive))
+
+        numbers.append(drive)
+
+    return numbers
+
+
+def drive_mask(drives):
+    """ Converts drive letters and/or drive numbers to a bitmask """
+
+    mask = 0
+    for drive_no in drive_numbers(drives):
+        mask |= 1 << drive_no
+
+    return mask
+
+
+class DriveLetterAllocator(object):
+    """ Allocates free drive letters to the mounts of the process. A letter
+    is free when it's not used by the OS (GetLogicalDrives), nor by a
+    volume the driver reported or mounted, nor reserved by another mount of
+    the process. Reservations are atomic, so concurrent mounts never pick
+    the same letter.
+    """
+
+    def __init__(self, logical_drives=None, preferred=None,
+                 excluded=DEFAULT_EXCLUDED):
+        """
+        :param logical_drives: function returning the bitmask of the drive
+        letters used by the OS, e.g. kernel32 GetLogicalDrives
+        :param preferred: drive letters or numbers tried first, in order
+        :param excluded: drive letters or numbers never allocated
+        """
+
+        self.logical_drives = logical_drives or (lambda: 0)
+        self.preferred = drive_numbers(preferred)
+        self.excluded = drive_mask(excluded)
+
+        # letters with a volume, as last reported by the driver and
+        # updated by the mounts and dismounts of the process
+        self._mounted = 0
+        # letters reserved by the mounts in progress
+        self._reserved = 0
+
+        self._lock = threading.Lock()
+
+    def observe_mounted(self, mask):
+        """ Updates the mounted letters from a driver listing
+
+        :param mask: the ulMountedDrives bitmask
+        """
+
+        with self._lock:
+            self._mounted = mask
+
+    def mark_mounted(self, drive_no):
+        """ Records a letter as used, e.g. taken by another process """
+
+        with self._lock:
+            self._mounted |= 1 << drive_no
+
+    def mark_dismounted(self, drive_no):
+        """ Records a letter as no longer used by a volume """
+
+        with self._lock:
+            self._mounted &= ~(1 << drive_no)
+
+    def occupied(self):
+        """ Returns the bitmask of the letters which can't be allocated """
+
+        logical_drives = self.logical_drives()
+        with self._lock:
+            return logical_drives | self._mounted | self._reserved | \
+                self.excluded
+
+    def reserve(self, preferred=None, excluded=None):
+        """ Reserves a free drive letter until it's released
+
+        :param preferred: drive letters or numbers tried first, in order,
+        before the allocator's preferred ones
+        :param excluded: drive letters or numbers not allocated, on top of
+        the allocator's excluded ones
+        :return: the reserved drive number
+        :raises DriverException: if no letter is free
+        """
+
+        order = drive_numbers(preferred) + self.preferred + \
+            list(DEFAULT_ORDER)
+        excluded = drive_mask(excluded)
+
+        # queried out of the lock, it's a system call
+        logical_drives = self.logical_drives()
+
+        with self._lock:
+            occupied = logical_drives | self._mounted | self._reserved | \
+                self.excluded | excluded
+
+            for drive_no in order:
+                if not occupied & (1 << drive_no):
+                    self._reserved |= 1 << drive_no
+                    return drive_no
+
+        raise DriverException('No free drive letter')
+
+    def release(self, drive_no, mounted=False):
+        """ Releases a reservation
+
+        :param mounted: True if a volume was mounted on the letter
+        """
+
+        with self._lock:
+            self._reserved &= ~(1 << drive_no)
+            if mounted:
+                self._mounted |= 1 << drive_no
+
+    def reservation(self, preferred=None, excluded=None):
+        """ Returns a context manager reserving a letter, released when the
+        context exits. The letter is recorded as mounted if no exception
+        was raised.
+        """
+
+        return Reservation(self, preferred, excluded)
+
+
+class Reservation(object):
+    """ Context manager holding a drive letter reservation """
+
+    def __init__(self, allocator, preferred=None, excluded=None):
+        self.allocator = allocator
+        self.preferred = preferred
+        self.excluded = excluded
+        self.drive_no = None
+
+    def __enter__(self):
+        self.drive_no = self.allocator.reserve(self.preferred, self.excluded)
+        return self.drive_no
+
+    def __exit__(self, typ, val, tb):
+        self.allocator.release(self.drive_no, mounted=typ is None)
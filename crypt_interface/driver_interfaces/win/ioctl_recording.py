@@ -0,0 +1,246 @@
+"""
+Recording and replaying of raw DeviceIoControl calls, for deterministic
+performance runs and offline debugging of struct layouts.
+
+Recordings hold the raw input and output buffers of the driver calls, which
+may carry secrets. The byte ranges of the redactions of RecordingTransport,
+by default the VeraCrypt passwords, are zeroed before being written, but
+the recordings should still be handled as sensitive data.
+
+File format: a magic header followed by appended records, each made of
+RECORD_HEADER and the zlib compressed input and output bytes.
+"""
+
+import ctypes
+import itertools
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from crypt_interface.driver_interfaces.exceptions import DriverException
+from crypt_interface.driver_interfaces.win.base_win_driver_models import (
+    zero_bytes)
+from crypt_interface.driver_interfaces.win.kernel32_interface import (
+    BaseTransport, Kernel32Transport)
+
+MAGIC = b'CIIOCTL1'
+
+# control code, status, returned count, last error, input size,
+# output size, compressed input size, compressed output size, duration
+RECORD_HEADER = struct.Struct('<IIIIIIIId')
+
+IoctlRecord = namedtuple('IoctlRecord', [
+    'control_code', 'status', 'returned', 'last_error',
+    'in_bytes', 'out_bytes', 'duration'])
+
+
+def copy_redacted(buffer, size, ranges=()):
+    """ Copies a buffer to a bytearray and zeroes some byte ranges of it.
+    The secrets are never held by an immutable bytes object.
+
+    :param buffer: pointer or ctypes object of the buffer
+    :param size: number of bytes copied
+    :param ranges: iterable of (offset, size) byte ranges zeroed in the copy,
+    clipped to the copied size
+    """
+
+    data = bytearray(size)
+    if size:
+        ctypes.memmove((ctypes.c_char * size).from_buffer(data), buffer, size)
+
+    for offset, length in ranges:
+        end = min(offset + length, size)
+        if offset < end:
+            data[offset:end] = zero_bytes(end - offset)
+
+    return data
+
+
+def write_record(file, record):
+    """ Appends an IoctlRecord to an opened file """
+
+    in_data = zlib.compress(record.in_bytes)
+    out_data = zlib.compress(record.out_bytes)
+
+    file.write(RECORD_HEADER.pack(
+        record.control_code, record.status, record.returned,
+        record.last_error, len(record.in_bytes), len(record.out_bytes),
+        len(in_data), len(out_data), record.duration))
+    file.write(in_data)
+    file.write(out_data)
+
+
+def read_records(path):
+    """ Yields the IoctlRecords stored in a file """
+
+    with open(str(path), 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise DriverException(
+                '{} is not an ioctl recording'.format(path))
+
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+
+            if len(header) < RECORD_HEADER.size:
+                raise DriverException(
+                    'Truncated ioctl recording: {}'.format(path))
+
+            (control_code, status, returned, last_error, in_size, out_size,
+             in_length, out_length, duration) = RECORD_HEADER.unpack(header)
+
+            in_bytes = zlib.decompress(file.read(in_length))
+            out_bytes = zlib.decompress(file.read(out_length))
+            if len(in_bytes) != in_size or len(out_bytes) != out_size:
+                raise DriverException(
+                    'Corrupted ioctl recording: {}'.format(path))
+
+            yield IoctlRecord(control_code, status, returned, last_error,
+                              in_bytes, out_bytes, duration)
+
+
+class RecordingTransport(BaseTransport):
+    """ Transport which forwards the calls to another transport and appends
+    each ioctl, with its raw buffers, to a recording file
+    """
+
+    def __init__(self, path, transport=None, redactions=None):
+        """
+        :param path: the recording file, created if missing
+        :param transport: the recorded transport, defaults to
+        Kernel32Transport
+        :param redactions: dict of control code: (offset, size) byte ranges
+        zeroed in the recorded input and output buffers of its calls,
+        defaults to the password fields of the VeraCrypt driver structs
+        """
+
+        if redactions is None:
+            # imported on first use, the recorder doesn't depend on a driver
+            from crypt_interface.driver_interfaces.win.veracrypt import (
+                driver_models)
+            redactions = driver_models.SECRET_RANGES
+
+        self.path = path
+        self.transport = transport or Kernel32Transport()
+        self.redactions = redactions
+
+        self._file = open(str(path), 'ab')
+        if not self._file.tell():
+            self._file.write(MAGIC)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def open(self, path):
+        return self.transport.open(path)
+
+    def close(self, handle):
+        self.transport.close(handle)
+
+    def is_valid(self, handle):
+        return self.transport.is_valid(handle)
+
+    def get_last_error(self):
+        return getattr(self._local, 'last_error', 0)
+
+    def get_logical_drives(self):
+        return self.transport.get_logical_drives()
+
+    def ioctl(self, handle, control_code, in_buffer, in_size,
+              out_buffer, out_size):
+        ranges = self.redactions.get(control_code, ())
+        in_bytes = copy_redacted(in_buffer, in_size, ranges)
+
+        start = time.perf_counter()
+        status, returned = self.transport.ioctl(
+            handle, control_code, in_buffer, in_size, out_buffer, out_size)
+        duration = time.perf_counter() - start
+
+        last_error = 0 if status else self.transport.get_last_error()
+        self._local.last_error = last_error
+
+        out_bytes = b''
+        if status and returned:
+            out_bytes = copy_redacted(out_buffer, returned, ranges)
+
+        with self._lock:
+            write_record(self._file, IoctlRecord(
+                control_code, int(bool(status)), returned, last_error,
+                in_bytes, out_bytes, duration))
+            self._file.flush()
+
+        return status, returned
+
+    def close_recording(self):
+        """ Closes the recording file """
+
+        with self._lock:
+            self._file.close()
+
+
+class ReplayTransport(BaseTransport):
+    """ Transport which answers the ioctls with the output buffers of a
+    recording, in order
+    """
+
+    def __init__(self, path, strict=True, realtime=False):
+        """
+        :param path: the recording file
+        :param strict: if True, a control code differing from the recorded
+        one raises a DriverException
+        :param realtime: if True, each call lasts as long as when recorded
+        """
+
+        self.path = path
+        self.strict = strict
+        self.realtime = realtime
+
+        self.records = list(read_records(path))
+
+        self._position = 0
+        self._handles = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def remaining(self):
+        """ Number of records not replayed yet """
+
+        return len(self.records) - self._position
+
+    def open(self, path):
+        return next(self._handles)
+
+    def close(self, handle):
+        pass
+
+    def get_last_error(self):
+        return getattr(self._local, 'last_error', 0)
+
+    def ioctl(self, handle, control_code, in_buffer, in_size,
+              out_buffer, out_size):
+        with self._lock:
+            if self._position >= len(self.records):
+                raise DriverException(
+                    'Recording {} has no more ioctl calls'.format(self.path))
+
+            record = self.records[self._position]
+            self._position += 1
+
+        if self.strict and record.control_code != control_code:
+            raise DriverException(
+                'Replayed control code {:#x} does not match the recorded '
+                '{:#x}'.format(control_code, record.control_code))
+
+        if self.realtime:
+            time.sleep(record.duration)
+
+        if record.out_bytes:
+            ctypes.memmove(out_buffer, record.out_bytes,
+                           min(out_size, len(record.out_bytes)))
+
+        self._local.last_error = record.last_error
+        return record.status, record.returned
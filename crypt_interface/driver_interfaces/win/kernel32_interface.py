@@ -1,7 +1,12 @@
+import collections
 import ctypes
+import threading
 from ctypes import wintypes
+from functools import lru_cache
 
-from crypt_interface.driver_interfaces.exceptions import DriverException
+from crypt_interface.driver_interfaces import metrics as metrics_module
+from crypt_interface.driver_interfaces.exceptions import (
+    DriverException, HandleOpenError)
 from crypt_interface.driver_interfaces.win import win_constants
 
 
@@ -59,6 +64,23 @@ def configure_deviceiocontrol_function():
     device_io_ctrl_func.restype = wintypes.BOOL
 
 
+@lru_cache(maxsize=None)
+def kernel32():
+    """ Loads kernel32 and configures the function signatures, on first use
+
+    :raises DriverException: if kernel32 is not available, i.e. off Windows
+    """
+
+    if not hasattr(ctypes, 'windll'):
+        raise DriverException('kernel32 is only available on Windows')
+
+    configure_create_file_function()
+    configure_deviceiocontrol_function()
+    ctypes.windll.kernel32.GetLogicalDrives.restype = wintypes.DWORD
+
+    return ctypes.windll.kernel32
+
+
 def create_file(filename, access, mode, creation, flags):
     """ Interface for CreateFile function
 
@@ -72,7 +94,7 @@ def create_file(filename, access, mode, creation, flags):
     :param flags: the file/device attributes
     """
 
-    create_func = ctypes.windll.kernel32.CreateFileW
+    create_func = kernel32().CreateFileW
     handle = create_func(filename, access.value, mode.value, win_constants.NULL,
                          creation.value, flags, win_constants.NULL)
 
@@ -86,7 +108,7 @@ def device_ioctl(device, control_code, in_buffer,
         http://msdn.microsoft.com/en-us/library/aa363216(v=vs.85).aspx
     """
 
-    device_ioctl_func = ctypes.windll.kernel32.DeviceIoControl
+    device_ioctl_func = kernel32().DeviceIoControl
 
     # allocate a DWORD, and take its reference
     returned = wintypes.DWORD(0)
@@ -98,11 +120,192 @@ def device_ioctl(device, control_code, in_buffer,
     return status, returned
 
 
+class BaseTransport(object):
+    """ Abstract transport used to open device handles and
+    issue DeviceIoControl calls on them
+    """
+
+    def open(self, path):
+        """ Opens a device handle
+
+        :param path: the path of the device
+        :return: an opaque handle, only meaningful to this transport
+        """
+
+        raise NotImplementedError
+
+    def close(self, handle):
+        """ Closes a device handle """
+
+        raise NotImplementedError
+
+    def is_valid(self, handle):
+        """ Checks if an opened handle can still be used """
+
+        return handle is not None
+
+    def ioctl(self, handle, control_code, in_buffer, in_size,
+              out_buffer, out_size):
+        """ Issues a DeviceIoControl call on an opened handle
+
+        :return: a tuple of the call status and the returned bytes count
+        """
+
+        raise NotImplementedError
+
+    def get_last_error(self):
+        """ Retrieves the error code of the last failed call """
+
+        raise NotImplementedError
+
+    def get_logical_drives(self):
+        """ Retrieves the bitmask of the drive letters used by the OS (bit 0
+        is A:), 0 if the transport doesn't know them
+        """
+
+        return 0
+
+
+class Kernel32Transport(BaseTransport):
+    """ Transport over the kernel32 CreateFileW/DeviceIoControl functions """
+
+    def open(self, path):
+        handle = create_file(
+            path,
+            win_constants.GenericAccessRights.READ,
+            win_constants.ShareMode.READ_WRITE,
+            win_constants.CreationDisposition.OPEN_EXISTING,
+            0)
+
+        if handle.value == win_constants.INVALID_HANDLE.value:
+            last_error = self.get_last_error()
+            raise HandleOpenError(
+                'Failed to open {}. GetLastError(): {}'.format(
+                    path, last_error), last_error)
+
+        return handle
+
+    def close(self, handle):
+        kernel32().CloseHandle(handle)
+
+    def is_valid(self, handle):
+        if handle is None or \
+                handle.value == win_constants.INVALID_HANDLE.value:
+            return False
+
+        # GetHandleInformation fails on closed or otherwise invalid handles
+        flags = wintypes.DWORD(0)
+        return bool(kernel32().GetHandleInformation(
+            handle, ctypes.byref(flags)))
+
+    def ioctl(self, handle, control_code, in_buffer, in_size,
+              out_buffer, out_size):
+        status, returned = device_ioctl(handle, control_code, in_buffer,
+                                        in_size, out_buffer, out_size)
+
+        return status, returned.value
+
+    def get_last_error(self):
+        return kernel32().GetLastError()
+
+    def get_logical_drives(self):
+        return kernel32().GetLogicalDrives()
+
+
+class HandlePool(object):
+    """ Pool of long-lived device handles. Handles are opened lazily,
+    health-checked before being reused and closed by close()
+    """
+
+    def __init__(self, path, transport=None, max_idle=4):
+        """
+        :param path: the path of the device
+        :param transport: the transport used to open/close handles,
+        defaults to Kernel32Transport
+        :param max_idle: maximum number of idle handles kept open
+        """
+
+        self.path = path
+        self.transport = transport or Kernel32Transport()
+        self.max_idle = max_idle
+
+        self.opened_count = 0
+        self.reused_count = 0
+
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Retrieves a healthy idle handle or opens a new one """
+
+        with self._lock:
+            while self._idle:
+                handle = self._idle.pop()
+                if self.transport.is_valid(handle):
+                    self.reused_count += 1
+                    return handle
+
+        handle = self.transport.open(self.path)
+
+        with self._lock:
+            self.opened_count += 1
+
+        return handle
+
+    def release(self, handle, discard=False):
+        """ Returns a handle to the pool
+
+        :param handle: the handle previously returned by acquire()
+        :param discard: if True, the handle is dropped instead of reused
+        """
+
+        with self._lock:
+            if not discard and len(self._idle) < self.max_idle:
+                self._idle.append(handle)
+                return
+
+        if self.transport.is_valid(handle):
+            self.transport.close(handle)
+
+    def close(self):
+        """ Closes all idle handles. The pool can still be used afterwards,
+        handles being reopened on demand.
+        """
+
+        with self._lock:
+            handles = list(self._idle)
+            self._idle.clear()
+
+        for handle in handles:
+            self.transport.close(handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.close()
+
+
 class DeviceIoControl(object):
     """ Context Manager for DeviceIOControl """
 
-    def __init__(self, path):
+    def __init__(self, path, transport=None, pool=None, metrics=None):
+        """
+        :param path: the path of the device
+        :param transport: the transport used for the calls, defaults to
+        the pool transport or to Kernel32Transport
+        :param pool: if set, handles are borrowed from it instead of
+        being opened and closed for each context
+        :param metrics: metrics.MetricsSink receiving the handle open and
+        ioctl timings, byte counts and failures
+        """
+
         self.path = path
+        self.pool = pool
+        self.transport = transport or (
+            pool.transport if pool else Kernel32Transport())
+        self.metrics = metrics or metrics_module.NULL_SINK
+        self.last_error = 0
         self._handle = None
 
     def _validate_handle(self):
@@ -111,10 +314,29 @@ class DeviceIoControl(object):
         if self._handle is None:
             raise DriverException('No file handle')
 
-        if self._handle.value == win_constants.INVALID_HANDLE.value:
-            raise DriverException(
-                'Failed to open {}. GetLastError(): {}'.format(
-                    self.path, ctypes.windll.kernel32.GetLastError()))
+    def _acquire(self):
+        """ Borrows a pooled handle or opens one, counting the failures by
+        error code
+        """
+
+        try:
+            if self.pool is not None:
+                return self.pool.acquire()
+
+            return self.transport.open(self.path)
+        except HandleOpenError as e:
+            self.metrics.increment(
+                'handle_open_failures_total',
+                error=metrics_module.error_label(
+                    e.code, win_constants.WinErrorCodes))
+            raise
+
+    def _reopen(self):
+        """ Drops the current pooled handle and borrows a fresh one """
+
+        self.pool.release(self._handle, discard=True)
+        self._handle = None
+        self._handle = self._acquire()
 
     def ioctl(self, control_code, in_buffer, in_size, out_buffer, out_size):
         """ Calls the DeviceIOControl function
@@ -125,23 +347,70 @@ class DeviceIoControl(object):
         :param out_buffer: output buffer
         :param out_size: size of the output buffer
         :return: the return value of the DeviceIOControl call, a tuple which
-        contains the returned bytes count as first element
+        contains the call status as first element and the returned bytes
+        count as second element
         """
 
         self._validate_handle()
-        return device_ioctl(self._handle, control_code, in_buffer,
-                            in_size, out_buffer, out_size)
+        with self.metrics.timed('ioctl_seconds', control_code=control_code):
+            status, returned = self._ioctl(
+                control_code, in_buffer, in_size, out_buffer, out_size)
+
+        self.metrics.increment(
+            'ioctl_bytes_in_total', in_size, control_code=control_code)
+        self.metrics.increment(
+            'ioctl_bytes_out_total', returned, control_code=control_code)
+
+        if not status:
+            self.metrics.increment(
+                'ioctl_failures_total', control_code=control_code,
+                error=metrics_module.error_label(
+                    self.last_error, win_constants.WinErrorCodes))
+
+        return status, returned
+
+    def _ioctl(self, control_code, in_buffer, in_size, out_buffer, out_size):
+        """ Issues the call on the transport, reopening a stale pooled
+        handle once
+        """
+
+        status, returned = self.transport.ioctl(
+            self._handle, control_code, in_buffer, in_size,
+            out_buffer, out_size)
+
+        if status:
+            return status, returned
+
+        self.last_error = self.transport.get_last_error()
+
+        # a pooled handle may have been invalidated since it was opened
+        if self.pool is not None and self.last_error == \
+                win_constants.WinErrorCodes.ERROR_INVALID_HANDLE.value:
+            self._reopen()
+            status, returned = self.transport.ioctl(
+                self._handle, control_code, in_buffer, in_size,
+                out_buffer, out_size)
+
+            if not status:
+                self.last_error = self.transport.get_last_error()
+
+        return status, returned
 
     def __enter__(self):
-        self._handle = create_file(
-            self.path,
-            win_constants.GenericAccessRights.READ,
-            win_constants.ShareMode.READ_WRITE,
-            win_constants.CreationDisposition.OPEN_EXISTING,
-            0)
+        with self.metrics.timed('handle_open_seconds'):
+            self._handle = self._acquire()
+
         self._validate_handle()
         return self
 
     def __exit__(self, typ, val, tb):
-        self._validate_handle()
-        ctypes.windll.kernel32.CloseHandle(self._handle)
+        # no handle left if reopening it failed, the open error propagates
+        if self._handle is None:
+            return
+
+        if self.pool is not None:
+            self.pool.release(self._handle)
+        else:
+            self.transport.close(self._handle)
+
+        self._handle = None
@@ -15,6 +15,8 @@ class CtlCodes(Enum):
     TC_IOCTL_DISMOUNT_ALL_VOLUMES = utils.vc_ctl_code(5)
     TC_IOCTL_GET_MOUNTED_VOLUMES = utils.vc_ctl_code(6)
     TC_IOCTL_GET_VOLUME_PROPERTIES = utils.vc_ctl_code(7)
+    TC_IOCTL_GET_PASSWORD_CACHE_STATUS = utils.vc_ctl_code(11)
+    TC_IOCTL_WIPE_PASSWORD_CACHE = utils.vc_ctl_code(12)
 
 
 class EncryptionAlgorithm(base_constants.PrintableEnum):
@@ -43,6 +45,24 @@ class VolumeType(base_constants.PrintableEnum):
     PROP_NBR_VOLUME_TYPES = 5
 
 
+class Pkcs5Prf(base_constants.PrintableEnum):
+    """ Header key derivation functions (src/Common/Crypto.h) """
+
+    NONE = 0
+    SHA512 = 1
+    WHIRLPOOL = 2
+    SHA256 = 3
+    RIPEMD160 = 4
+    STREEBOG = 5
+
+
+class HiddenVolumeProtection(base_constants.PrintableEnum):
+    HIDVOL_PROT_STATUS_NONE = 0
+    HIDVOL_PROT_STATUS_ACTIVE = 1
+    # write operations to the protected area were blocked
+    HIDVOL_PROT_STATUS_ACTION_TAKEN = 2
+
+
 class UnMountErrorCodes(base_constants.PrintableEnum):
     VOLUME_NOT_MOUNTED = 5
     FILES_OPENED = 6
@@ -55,10 +75,12 @@ UnMountErrorCodes._labels = {
 
 
 class MountErrorCodes(base_constants.PrintableEnum):
+    OS_ERROR = 1
     ACCESS_DENIED = 3
     DRIVE_OCCUPIED = 5
 
 MountErrorCodes._labels = {
+    MountErrorCodes.OS_ERROR: 'Volume could not be opened.',
     MountErrorCodes.ACCESS_DENIED: 'Access denied!',
     MountErrorCodes.DRIVE_OCCUPIED: 'Selected drive is occupied.'
 }
@@ -2,20 +2,31 @@ import ctypes
 import ctypes.wintypes as wintypes
 from functools import partialmethod
 
-from crypt_interface.driver_interfaces import win
-from crypt_interface.driver_interfaces.win import base_win_driver_models
+from crypt_interface.driver_interfaces.win import (
+    base_win_driver_models, win_constants)
 from crypt_interface.driver_interfaces.win.veracrypt import constants
 
 
 class VCPConverters(base_win_driver_models.PConverters):
 
-    enc_algorithm = partialmethod(
-        base_win_driver_models.PConverters.enum_converter,
-        enum_class=constants.EncryptionAlgorithm)
+    enc_algorithm = staticmethod(
+        base_win_driver_models.PConverters.enum_lookup(
+            constants.EncryptionAlgorithm))
 
-    volume_type = partialmethod(
-        base_win_driver_models.PConverters.enum_converter,
-        enum_class=constants.VolumeType)
+    volume_type = staticmethod(
+        base_win_driver_models.PConverters.enum_lookup(constants.VolumeType))
+
+    pkcs5_prf = staticmethod(
+        base_win_driver_models.PConverters.enum_lookup(constants.Pkcs5Prf))
+
+    # the driver copies the raw volume id bytes into the wchar array
+    volume_id = staticmethod(
+        base_win_driver_models.PConverters.buffer_bytes(
+            win_constants.VOLUME_ID_SIZE))
+
+    hidden_vol_protection = staticmethod(
+        base_win_driver_models.PConverters.enum_lookup(
+            constants.HiddenVolumeProtection))
 
 
 class VCCConverters(base_win_driver_models.CConverters):
@@ -37,50 +48,50 @@ class MountListStruct(base_win_driver_models.BaseStruct):
         base_win_driver_models.Field(
             name='wszVolume', alias='path', field_type=(
                 ctypes.c_wchar * constants.TC_MAX_PATH
-                * win.win_constants.MAX_VOLUMES),
+                * win_constants.MAX_VOLUMES),
             is_indexed=True,
             converter=VCPConverters.wchar_array_path),
 
         # labels of mounted volumes
         base_win_driver_models.Field(
             name='wszLabel', alias='label', field_type=(
-                ctypes.c_wchar * win.win_constants.VOLUME_LABEL_SIZE
-                * win.win_constants.MAX_VOLUMES),
+                ctypes.c_wchar * win_constants.VOLUME_LABEL_SIZE
+                * win_constants.MAX_VOLUMES),
             is_indexed=True,
             converter=VCPConverters.wchar_array),
 
         # IDs of mounted volumes
         base_win_driver_models.Field(
             name='volumeID', alias='volume_id', field_type=(
-                ctypes.c_wchar * win.win_constants.VOLUME_ID_SIZE
-                * win.win_constants.MAX_VOLUMES),
-            is_indexed=True,
-            converter=VCPConverters.wchar_utf16_surrogate_pass_byte_array),
+                ctypes.c_wchar * win_constants.VOLUME_ID_SIZE
+                * win_constants.MAX_VOLUMES),
+            is_indexed=True, raw=True,
+            converter=VCPConverters.volume_id),
 
         # disk size in bytes
         base_win_driver_models.Field(
             name='diskLength', alias='disk_length', field_type=(
-                ctypes.c_uint64 * win.win_constants.MAX_VOLUMES),
+                ctypes.c_uint64 * win_constants.MAX_VOLUMES),
             is_indexed=True),
 
         # encryption algorithm
         base_win_driver_models.Field(
             name='ea', alias='enc_algorithm', field_type=(
-                ctypes.c_int * win.win_constants.MAX_VOLUMES),
+                ctypes.c_int * win_constants.MAX_VOLUMES),
             is_indexed=True,
             converter=VCPConverters.enc_algorithm),
 
         # volume type (e.g. PROP_VOL_TYPE_OUTER, etc.)
         base_win_driver_models.Field(
             name='volumeType', alias='volume_type', field_type=(
-                ctypes.c_int * win.win_constants.MAX_VOLUMES),
+                ctypes.c_int * win_constants.MAX_VOLUMES),
             is_indexed=True,
             converter=VCPConverters.volume_type),
 
         # truecrypt mode
         base_win_driver_models.Field(
             name='truecryptMode', alias='truecrypt_mode', field_type=(
-                wintypes.BOOL * win.win_constants.MAX_VOLUMES),
+                wintypes.BOOL * win_constants.MAX_VOLUMES),
             is_indexed=True,
             converter=VCPConverters.win_bool),
     ] + base_win_driver_models.BaseStruct.base_fields
@@ -107,6 +118,19 @@ class PasswordStruct(base_win_driver_models.BaseStruct):
     _fields_ = base_win_driver_models.Field.iterable_to_struct_fields(
         field_list)
 
+    def write(self, password):
+        """ Copies a password straight into Text, with a single memmove
+
+        :param password: bytes, bytearray or memoryview
+        """
+
+        if memoryview(password).nbytes > constants.MAX_PASSWORD:
+            raise ValueError('Password is longer than {} bytes'.format(
+                constants.MAX_PASSWORD))
+
+        self.Length = base_win_driver_models.CConverters.copy_into(
+            password, self.Text)
+
 
 class MountStruct(base_win_driver_models.BaseStruct):
     """ src/Common/Apidrvr.h: MOUNT_STRUCT """
@@ -243,7 +267,7 @@ class MountStruct(base_win_driver_models.BaseStruct):
         # maximum label length is 32 for NTFS and 11 for FAT32
         base_win_driver_models.Field(
             name='wszLabel', alias='label',
-            field_type=ctypes.c_wchar * win.win_constants.VOLUME_LABEL_SIZE),
+            field_type=ctypes.c_wchar * win_constants.VOLUME_LABEL_SIZE),
 
         base_win_driver_models.Field(
             name='bIsNTFS', alias='is_ntfs', field_type=wintypes.BOOL),
@@ -284,12 +308,12 @@ class UnMountStruct(base_win_driver_models.BaseStruct):
 
         base_win_driver_models.Field(
             name='ignoreOpenFiles', alias='ignore_open_files_enabled',
-            field_type=wintypes.BOOL),
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
 
         base_win_driver_models.Field(
             name='HiddenVolumeProtectionTriggered',
             alias='hidden_vol_protection_triggered',
-            field_type=wintypes.BOOL),
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
 
         # return code back from the driver
         base_win_driver_models.Field(
@@ -299,3 +323,138 @@ class UnMountStruct(base_win_driver_models.BaseStruct):
 
     _fields_ = base_win_driver_models.Field.iterable_to_struct_fields(
         field_list)
+
+
+class VolumePropertiesStruct(base_win_driver_models.BaseStruct):
+    """ src/Common/Apidrvr.h: VOLUME_PROPERTIES_STRUCT """
+
+    field_list = [
+        # drive number of the queried volume
+        base_win_driver_models.Field(
+            name='driveNo', alias='drive_no', field_type=ctypes.c_int),
+
+        # identifier assigned by the driver to each mount
+        base_win_driver_models.Field(
+            name='uniqueId', alias='unique_id', field_type=ctypes.c_int),
+
+        base_win_driver_models.Field(
+            name='wszVolume', alias='path',
+            field_type=ctypes.c_wchar * constants.TC_MAX_PATH,
+            converter=VCPConverters.path),
+
+        # disk size in bytes
+        base_win_driver_models.Field(
+            name='diskLength', alias='disk_length',
+            field_type=ctypes.c_uint64),
+
+        base_win_driver_models.Field(
+            name='ea', alias='enc_algorithm', field_type=ctypes.c_int,
+            converter=VCPConverters.enc_algorithm),
+
+        # encryption mode (XTS)
+        base_win_driver_models.Field(
+            name='mode', alias='mode', field_type=ctypes.c_int),
+
+        # header key derivation function (hash algorithm)
+        base_win_driver_models.Field(
+            name='pkcs5', alias='pkcs5_prf', field_type=ctypes.c_int,
+            converter=VCPConverters.pkcs5_prf),
+
+        base_win_driver_models.Field(
+            name='pkcs5Iterations', alias='pkcs5_iterations',
+            field_type=ctypes.c_int),
+
+        base_win_driver_models.Field(
+            name='hiddenVolume', alias='hidden_volume',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+
+        base_win_driver_models.Field(
+            name='readOnly', alias='read_only',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+
+        base_win_driver_models.Field(
+            name='removable', alias='removable',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+
+        base_win_driver_models.Field(
+            name='partitionInInactiveSysEncScope',
+            alias='inactive_enclosing_enc_partition',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+
+        base_win_driver_models.Field(
+            name='volumeHeaderFlags', alias='header_flags',
+            field_type=ctypes.c_uint32),
+
+        # I/O counters, in bytes
+        base_win_driver_models.Field(
+            name='totalBytesRead', alias='total_bytes_read',
+            field_type=ctypes.c_uint64),
+
+        base_win_driver_models.Field(
+            name='totalBytesWritten', alias='total_bytes_written',
+            field_type=ctypes.c_uint64),
+
+        base_win_driver_models.Field(
+            name='hiddenVolProtection', alias='hidden_vol_protection',
+            field_type=ctypes.c_int,
+            converter=VCPConverters.hidden_vol_protection),
+
+        base_win_driver_models.Field(
+            name='volFormatVersion', alias='format_version',
+            field_type=ctypes.c_int),
+
+        base_win_driver_models.Field(
+            name='volumePim', alias='pim', field_type=ctypes.c_int),
+
+        base_win_driver_models.Field(
+            name='wszLabel', alias='label',
+            field_type=ctypes.c_wchar * win_constants.VOLUME_LABEL_SIZE),
+
+        base_win_driver_models.Field(
+            name='bDriverSetLabel', alias='driver_set_label',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+
+        base_win_driver_models.Field(
+            name='volumeID', alias='volume_id',
+            field_type=ctypes.c_ubyte * win_constants.VOLUME_ID_SIZE,
+            converter=VCPConverters.ubyte_array_bytes),
+
+        base_win_driver_models.Field(
+            name='mountDisabled', alias='mount_disabled',
+            field_type=wintypes.BOOL, converter=VCPConverters.win_bool),
+    ] + base_win_driver_models.BaseStruct.base_fields
+
+    _fields_ = base_win_driver_models.Field.iterable_to_struct_fields(
+        field_list)
+
+
+class DriverVersionStruct(base_win_driver_models.BaseStruct):
+    """ Output of TC_IOCTL_GET_DRIVER_VERSION: a LONG """
+
+    field_list = [
+        # VERSION_NUM of the driver, e.g. 0x0125 for 1.25
+        base_win_driver_models.Field(
+            name='version', alias='version', field_type=wintypes.LONG),
+    ]
+
+    _fields_ = base_win_driver_models.Field.iterable_to_struct_fields(
+        field_list)
+
+
+def password_ranges(struct_class):
+    """ Returns the (offset, size) byte ranges of the PasswordStruct fields
+    of a struct class
+    """
+
+    return [(getattr(struct_class, field.name).offset,
+             ctypes.sizeof(PasswordStruct))
+            for field in struct_class.field_list
+            if field.type is PasswordStruct]
+
+
+# byte ranges of the ioctl buffers holding passwords, by control code, e.g.
+# blanked out of ioctl recordings
+SECRET_RANGES = {
+    constants.CtlCodes.TC_IOCTL_MOUNT_VOLUME.value:
+        password_ranges(MountStruct),
+}
@@ -0,0 +1,140 @@
+"""
+Registry of the struct layouts spoken by the VeraCrypt driver versions.
+
+A driver with a version covered by the registry gets struct classes
+without the excess buffer, so its calls neither carry nor check the 10 KB
+guard. Unknown versions fall back to the guarded classes of driver_models.
+The classes of a layout are built the first time it's used and checked
+against the struct sizes and field offsets of the driver headers.
+"""
+
+import ctypes
+import ctypes.wintypes as wintypes
+import sys
+
+from crypt_interface.driver_interfaces.win import base_win_driver_models
+from crypt_interface.driver_interfaces.win.veracrypt import driver_models
+
+# struct classes exchanged with the driver, in their guarded form
+DRIVER_STRUCTS = (
+    driver_models.MountListStruct,
+    driver_models.MountStruct,
+    driver_models.UnMountStruct,
+    driver_models.VolumePropertiesStruct,
+)
+
+# the sizes and offsets of the driver headers assume the Windows type sizes.
+# Elsewhere, e.g. with the simulated driver, the layouts aren't checked
+DRIVER_TYPE_SIZES = ctypes.sizeof(ctypes.c_wchar) == 2 and \
+    ctypes.sizeof(wintypes.BOOL) == 4
+
+# src/Common/Apidrvr.h of VeraCrypt 1.23 - 1.25: sizeof and key field
+# offsets of the structs, by guarded class
+APIDRVR_1_23 = {
+    driver_models.MountListStruct: (17424, {
+        'ulMountedDrives': 0, 'wszVolume': 4, 'wszLabel': 13524,
+        'volumeID': 15240, 'diskLength': 16904, 'truecryptMode': 17320}),
+    driver_models.MountStruct: (852, {
+        'wszVolume': 16, 'VolumePassword': 536, 'nDosDriveNo': 612,
+        'ProtectedHidVolPassword': 656, 'pkcs5_prf': 736, 'VolumePim': 752,
+        'wszLabel': 760, 'AlignmentMask': 848}),
+    driver_models.UnMountStruct: (16, {
+        'nDosDriveNo': 0, 'ignoreOpenFiles': 4, 'nReturnCode': 12}),
+    driver_models.VolumePropertiesStruct: (712, {
+        'wszVolume': 8, 'diskLength': 528, 'totalBytesRead': 576,
+        'wszLabel': 604, 'volumeID': 676, 'mountDisabled': 708}),
+}
+
+
+def format_version(version):
+    """ Formats a VERSION_NUM (e.g. 0x0125) as a version string """
+
+    return '{}.{:x}'.format(version >> 8, version & 0xff)
+
+
+class StructLayout(object):
+    """ Struct classes to use for a range of driver versions """
+
+    def __init__(self, name, min_version, max_version, guarded=False,
+                 struct_classes=DRIVER_STRUCTS, expected=None):
+        """
+        :param name: description of the layout
+        :param min_version: first driver VERSION_NUM using the layout
+        :param max_version: last driver VERSION_NUM using the layout
+        :param guarded: if True, the struct classes keep the excess buffer
+        :param struct_classes: guarded struct classes of the layout
+        :param expected: dict of guarded class: (sizeof, dict of field name:
+        offset) of the driver headers, checked against the classes used for
+        the driver calls
+        """
+
+        self.name = name
+        self.min_version = min_version
+        self.max_version = max_version
+        self.guarded = guarded
+        self.struct_classes = struct_classes
+        self.expected = expected or {}
+
+        self._structs = None
+
+    @property
+    def structs(self):
+        """ Dict of guarded class: class used for the driver calls
+
+        :raises DriverException: if a class doesn't match the driver headers
+        """
+
+        if self._structs is None:
+            structs = {
+                struct_class: struct_class if self.guarded else
+                base_win_driver_models.unguarded_struct(struct_class)
+                for struct_class in self.struct_classes}
+
+            if DRIVER_TYPE_SIZES:
+                for struct_class, (size, offsets) in self.expected.items():
+                    base_win_driver_models.check_struct_layout(
+                        structs[struct_class], size, offsets)
+
+            self._structs = structs
+
+        return self._structs
+
+    def matches(self, version):
+        return self.min_version <= version <= self.max_version
+
+    def resolve(self, struct_class):
+        """ Returns the class to use for a driver_models struct class """
+
+        return self.structs.get(struct_class, struct_class)
+
+    def __repr__(self):
+        if self.guarded:
+            return '<{}: {}>'.format(self.__class__.__name__, self.name)
+
+        return '<{}: {} ({} - {})>'.format(
+            self.__class__.__name__, self.name,
+            format_version(self.min_version),
+            format_version(self.max_version))
+
+    __str__ = __repr__
+
+
+# used for drivers with an unknown version
+GUARDED_LAYOUT = StructLayout('guarded', 0, sys.maxsize, guarded=True)
+
+# layouts of src/Common/Apidrvr.h modelled in driver_models, newest first
+LAYOUTS = [
+    StructLayout('1.23', 0x0123, 0x0125, expected=APIDRVR_1_23),
+]
+
+
+def find_layout(version):
+    """ Returns the StructLayout registered for a driver version, or
+    GUARDED_LAYOUT if the version is unknown
+    """
+
+    for layout in LAYOUTS:
+        if layout.matches(version):
+            return layout
+
+    return GUARDED_LAYOUT
@@ -1,9 +1,37 @@
-from crypt_interface.driver_interfaces import win
+from array import array
+from functools import lru_cache
+
+from crypt_interface.driver_interfaces import (
+    base_crypt_interface, exceptions)
+from crypt_interface.driver_interfaces.win import (
+    base_win_driver_models, base_win_models, win_constants)
+from crypt_interface.driver_interfaces.win.veracrypt import (
+    constants, driver_models)
 from crypt_interface.driver_interfaces.win.veracrypt.driver_models import (
     MountListStruct,)
 
 
-class Volume(win.base_win_models.BaseVolume):
+@lru_cache(maxsize=None)
+def numpy_module():
+    """ Returns the numpy module, or None if it's not installed """
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+def enum_value(val):
+    """ Returns the value of an Enum member, or val if it's not one """
+
+    return getattr(val, 'value', val)
+
+
+class Volume(base_win_models.BaseVolume):
+    __slots__ = ()
+
     @staticmethod
     def from_veracrypt_mount_list_struct(
             mount_list: MountListStruct, index: int):
@@ -18,7 +46,7 @@ class Volume(win.base_win_models.BaseVolume):
 
         volume = Volume()
 
-        win.base_win_driver_models.Field.struct_to_object(
+        base_win_driver_models.Field.struct_to_object(
             volume, mount_list, index)
 
         # if path is None, the volume is not mounted
@@ -30,21 +58,392 @@ class Volume(win.base_win_models.BaseVolume):
 
         return volume
 
+    @staticmethod
+    def check_mounted_drives(mount_list: MountListStruct):
+        """ Cross-checks the ulMountedDrives bitmask of a MountListStruct
+        against the slots that contain a volume path
+
+        :param mount_list: the instance to be checked
+        :raises DriverException: if the bitmask and the paths disagree
+        """
+
+        mask = mount_list.ulMountedDrives
+        mismatched = [
+            i for i in range(win_constants.MAX_VOLUMES)
+            if bool(mask & (1 << i)) != (mount_list.wszVolume[i][0] != '\0')]
+
+        if mismatched:
+            raise exceptions.DriverException(
+                'Mounted drives bitmask {:#x} does not match the mounted '
+                'volume paths for drives: {}'.format(
+                    mask, ', '.join(chr(ord('A') + i) for i in mismatched)))
+
     @classmethod
-    def mount_list_to_volume_list(cls, mount_list: MountListStruct):
-        """ Converts a MountListStruct list to a list of Volumes
+    def mount_list_to_volume_list(cls, mount_list: MountListStruct,
+                                  verify=False):
+        """ Converts a MountListStruct list to a list of Volumes. Only the
+        slots flagged in the ulMountedDrives bitmask are decoded, using the
+        compiled codec plan of the struct.
 
         :param mount_list: the instance which will be converted
+        :param verify: if True, the bitmask is cross-checked against the
+        volume paths before decoding
 
         :rtype: List[BaseVolume]
         :return: the list of volumes
         """
 
+        if verify:
+            cls.check_mounted_drives(mount_list)
+
+        indices = [
+            i for i in base_win_models.drive_numbers_from_mask(
+                mount_list.ulMountedDrives)
+            if i < win_constants.MAX_VOLUMES]
+
         volumes = []
 
-        for i in range(win.win_constants.MAX_VOLUMES):
-            vol = cls.from_veracrypt_mount_list_struct(mount_list, i)
-            if vol:
-                volumes.append(vol)
+        for index, volume in zip(indices, mount_list.codec.decode_slots(
+                mount_list, indices, cls)):
+            # if path is empty, the volume is not mounted
+            if not volume.path:
+                continue
+
+            volume.is_mounted = True
+            volume.drive_no = index
+            volumes.append(volume)
 
         return volumes
+
+
+class DismountAllResult(object):
+    """ Holds the outcome of a dismount of all volumes """
+
+    def __init__(self):
+        self.return_code = 0
+        self.hidden_vol_protection_triggered = False
+
+        # drive number: reason, for the volumes still mounted
+        self.failed = {}
+
+    @property
+    def succeeded(self):
+        return self.return_code == 0 and not self.failed
+
+    @property
+    def error(self):
+        """ The driver return code, as UnMountErrorCodes if known """
+
+        return base_win_driver_models.PConverters.enum_converter(
+            self.return_code, constants.UnMountErrorCodes)
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, self.__dict__)
+
+    __str__ = __repr__
+
+
+class SessionMountResult(base_crypt_interface.MountResult):
+    """ Outcome of a mount within a mount session """
+
+    def __init__(self, request, error=None, elapsed=0.0, from_cache=False):
+        """
+        :param from_cache: True if the driver used its password cache
+        instead of a password sent with the mount
+        """
+
+        super().__init__(request, error, elapsed)
+        self.from_cache = from_cache
+
+
+class VolumeProperties(object):
+    """ Holds the properties of a mounted volume, as returned by
+    TC_IOCTL_GET_VOLUME_PROPERTIES
+    """
+
+    # attributes which change while the volume stays mounted
+    volatile_fields = ('total_bytes_read', 'total_bytes_written',
+                       'hidden_vol_protection')
+
+    def __init__(self):
+        self.drive_no = 0
+        self.unique_id = 0
+        self.path = ''
+        self.label = ''
+        self.volume_id = b''
+        self.disk_length = 0
+        self.enc_algorithm = 0
+        self.mode = 0
+        self.pkcs5_prf = 0
+        self.pkcs5_iterations = 0
+        self.pim = 0
+        self.hidden_volume = False
+        self.read_only = False
+        self.removable = False
+        self.inactive_enclosing_enc_partition = False
+        self.header_flags = 0
+        self.format_version = 0
+        self.driver_set_label = False
+        self.mount_disabled = False
+        self.total_bytes_read = 0
+        self.total_bytes_written = 0
+        self.hidden_vol_protection = 0
+
+    def to_dict(self):
+        """ Returns the properties as a dict """
+
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, self.__dict__)
+
+    __str__ = __repr__
+
+
+class VolumeTable(object):
+    """ Columnar store of volumes, e.g. the volumes of many hosts. The
+    numeric attributes are kept in array columns, shared with NumPy arrays
+    for vectorised filters and aggregates when NumPy is installed.
+
+    NumPy arrays returned by column() share the memory of the table, which
+    can't be extended while they are alive.
+    """
+
+    # column name: array typecode
+    numeric_columns = (
+        # index of the volume list (e.g. host) the volume came from
+        ('source', 'I'),
+        ('drive_no', 'i'),
+        ('disk_length', 'Q'),
+        ('enc_algorithm', 'i'),
+        ('volume_type', 'i'),
+        ('truecrypt_mode', 'B'),
+    )
+
+    # columns holding Python objects
+    object_columns = ('path', 'label', 'volume_id')
+
+    # column name: converter of the stored values to Python values
+    converters = {
+        'enc_algorithm': driver_models.VCPConverters.enc_algorithm,
+        'volume_type': driver_models.VCPConverters.volume_type,
+        'truecrypt_mode': bool,
+    }
+
+    def __init__(self):
+        self.columns = {name: array(typecode)
+                        for name, typecode in self.numeric_columns}
+        self.columns.update({name: [] for name in self.object_columns})
+
+    def __len__(self):
+        return len(self.columns['source'])
+
+    def append(self, volume, source=0):
+        """ Adds a volume as a row
+
+        :param volume: the BaseVolume
+        :param source: index of the volume list the volume came from
+        """
+
+        columns = self.columns
+        columns['source'].append(source)
+        columns['drive_no'].append(volume.drive_no)
+        columns['disk_length'].append(volume.disk_length)
+        columns['enc_algorithm'].append(enum_value(volume.enc_algorithm))
+        columns['volume_type'].append(enum_value(volume.volume_type))
+        columns['truecrypt_mode'].append(bool(volume.truecrypt_mode))
+
+        for name in self.object_columns:
+            columns[name].append(getattr(volume, name))
+
+    def extend(self, table):
+        """ Appends the rows of another table """
+
+        for name, column in self.columns.items():
+            column.extend(table.columns[name])
+
+    @classmethod
+    def from_volume_lists(cls, volume_lists):
+        """ Builds a table from an iterable of volume lists. The source
+        column holds the position of the list each volume came from.
+        """
+
+        table = cls()
+        for source, volumes in enumerate(volume_lists):
+            for volume in volumes:
+                table.append(volume, source)
+
+        return table
+
+    @classmethod
+    def from_mount_list(cls, mount_list: MountListStruct, source=0):
+        """ Builds a table from the mounted slots of a MountListStruct,
+        reading the numeric columns straight from the struct arrays
+        """
+
+        codec = mount_list.codec
+        indices = [
+            i for i in base_win_models.drive_numbers_from_mask(
+                mount_list.ulMountedDrives)
+            if i < win_constants.MAX_VOLUMES]
+
+        # if path is empty, the volume is not mounted
+        paths, = codec.decode_columns(mount_list, indices, ('path',))
+        indices = [index for index, path in zip(indices, paths) if path]
+
+        table = cls()
+        columns = table.columns
+        columns['source'].extend([source] * len(indices))
+        columns['drive_no'].extend(indices)
+
+        numeric = ('disk_length', 'enc_algorithm', 'volume_type',
+                   'truecrypt_mode')
+        for name, column in zip(numeric, codec.read_columns(
+                mount_list, numeric)):
+            columns[name].extend([column[index] for index in indices])
+
+        for name, values in zip(cls.object_columns, codec.decode_columns(
+                mount_list, indices, cls.object_columns)):
+            columns[name].extend(values)
+
+        return table
+
+    def column(self, name):
+        """ Returns a column as a NumPy array sharing the table memory, or
+        as the raw array/list if NumPy is not installed
+        """
+
+        numpy = numpy_module()
+        column = self.columns[name]
+        if numpy is None:
+            return column
+
+        if isinstance(column, array):
+            return numpy.frombuffer(column, dtype=column.typecode)
+
+        return numpy.array(column, dtype=object)
+
+    def _take(self, indices):
+        """ Returns a new table with the rows at the given indices """
+
+        table = VolumeTable()
+        for name, column in self.columns.items():
+            if isinstance(column, array):
+                table.columns[name] = array(
+                    column.typecode, [column[i] for i in indices])
+            else:
+                table.columns[name] = [column[i] for i in indices]
+
+        return table
+
+    def filter(self, selector):
+        """ Returns a new table with the rows flagged by a selector
+
+        :param selector: sequence of booleans, one per row, e.g. a NumPy
+        boolean array such as table.column('disk_length') > 1 << 30
+        """
+
+        numpy = numpy_module()
+        if numpy is not None:
+            indices = numpy.flatnonzero(numpy.asarray(selector)).tolist()
+        else:
+            indices = [i for i, keep in enumerate(selector) if keep]
+
+        return self._take(indices)
+
+    def where(self, **conditions):
+        """ Returns a new table with the rows equal to the given values,
+        e.g. where(enc_algorithm=EncryptionAlgorithm.AES)
+        """
+
+        numpy = numpy_module()
+        if numpy is not None:
+            selector = numpy.ones(len(self), dtype=bool)
+            for name, value in conditions.items():
+                selector &= self.column(name) == enum_value(value)
+        else:
+            selector = [True] * len(self)
+            for name, value in conditions.items():
+                value = enum_value(value)
+                selector = [keep and item == value for keep, item in zip(
+                    selector, self.columns[name])]
+
+        return self.filter(selector)
+
+    def _convert(self, name, value):
+        return self.converters.get(name, lambda x: x)(value)
+
+    def total(self, name='disk_length'):
+        """ Returns the sum of a numeric column """
+
+        numpy = numpy_module()
+        if numpy is not None:
+            return int(self.column(name).sum(dtype='uint64'))
+
+        return sum(self.columns[name])
+
+    def sum_by(self, key, name='disk_length'):
+        """ Sums a numeric column per distinct value of another column,
+        e.g. the mounted bytes per encryption algorithm
+
+        :param key: the grouping column
+        :param name: the summed column
+        :return: dict of converted key value: sum
+        """
+
+        numpy = numpy_module()
+        if numpy is not None:
+            keys = self.column(key)
+            values = self.column(name)
+            return {
+                self._convert(key, group.item()):
+                    int(values[keys == group].sum(dtype='uint64'))
+                for group in numpy.unique(keys)}
+
+        totals = {}
+        for group, value in zip(self.columns[key], self.columns[name]):
+            totals[group] = totals.get(group, 0) + value
+
+        return {self._convert(key, group): total
+                for group, total in totals.items()}
+
+    def count_by(self, key):
+        """ Counts the rows per distinct value of a column
+
+        :return: dict of converted key value: count
+        """
+
+        numpy = numpy_module()
+        if numpy is not None:
+            groups, counts = numpy.unique(
+                self.column(key), return_counts=True)
+            return {self._convert(key, group.item()): int(count)
+                    for group, count in zip(groups, counts)}
+
+        counts = {}
+        for group in self.columns[key]:
+            counts[group] = counts.get(group, 0) + 1
+
+        return {self._convert(key, group): count
+                for group, count in counts.items()}
+
+    def to_volumes(self):
+        """ Converts the rows back to Volumes """
+
+        volumes = []
+        names = [name for name, _ in self.numeric_columns
+                 if name != 'source'] + list(self.object_columns)
+
+        for row in zip(*(self.columns[name] for name in names)):
+            volume = Volume()
+            volume.is_mounted = True
+            for name, value in zip(names, row):
+                setattr(volume, name, self._convert(name, value))
+            volumes.append(volume)
+
+        return volumes
+
+    def __repr__(self):
+        return '<{}: {} volumes>'.format(self.__class__.__name__, len(self))
+
+    __str__ = __repr__
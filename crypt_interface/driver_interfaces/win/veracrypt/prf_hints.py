@@ -0,0 +1,171 @@
+"""
+Persistent hints of the header key derivation function (PRF) and PIM which
+opened each container. Mounting with the right PRF spares the driver from
+trying every supported PRF until one matches.
+
+File format: a JSON object of container key: {"prf": int, "pim": int}.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from crypt_interface.driver_interfaces.win.veracrypt import constants
+
+
+class PrfHint(object):
+    """ PRF, and optionally PIM, which opened a container """
+
+    __slots__ = ('prf', 'pim')
+
+    def __init__(self, prf, pim=0):
+        """
+        :param prf: member of constants.Pkcs5Prf
+        :param pim: the PIM, 0 when unknown or not remembered
+        """
+
+        self.prf = prf
+        self.pim = pim
+
+    def to_dict(self):
+        return {'prf': self.prf.value, 'pim': self.pim}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(constants.Pkcs5Prf(data['prf']), data.get('pim', 0))
+
+    def __eq__(self, other):
+        return isinstance(other, PrfHint) and \
+            (self.prf, self.pim) == (other.prf, other.pim)
+
+    def __repr__(self):
+        return '<{}: {} pim={}>'.format(
+            self.__class__.__name__, self.prf, self.pim)
+
+    __str__ = __repr__
+
+
+def container_keys(path, volume_id=None):
+    """ Returns the keys the hint of a container may be stored under: its
+    volume id when known, and its path
+    """
+
+    keys = []
+    if volume_id:
+        keys.append('id:' + bytes(volume_id).hex())
+    if path:
+        keys.append('path:' + path.lower())
+
+    return keys
+
+
+class PrfHintStore(object):
+    """ Thread-safe store of PrfHints, optionally persisted to a file which
+    is rewritten atomically on every change
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: the JSON file of the hints, created on the first
+        change. Hints are only kept in memory if not set.
+        """
+
+        self.path = Path(path) if path is not None else None
+
+        # lookups which found a hint
+        self.hits = 0
+        # lookups which found no hint
+        self.misses = 0
+        # hinted mounts which had to fall back to auto-detection
+        self.fallbacks = 0
+
+        self._hints = {}
+        self._lock = threading.Lock()
+
+        if self.path is not None:
+            self._hints = self._load()
+
+    def _load(self):
+        """ Reads the hints file, ignoring a missing or corrupted file """
+
+        try:
+            with open(str(self.path)) as file:
+                data = json.load(file)
+            return {key: PrfHint.from_dict(value)
+                    for key, value in data.items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _save(self):
+        """ Writes the hints to a temporary file, then swaps it with the
+        hints file, so readers never see a partial file
+        """
+
+        if self.path is None:
+            return
+
+        data = {key: hint.to_dict() for key, hint in self._hints.items()}
+        directory = str(self.path.parent)
+
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=self.path.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(data, file, sort_keys=True)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, str(self.path))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def lookup(self, path, volume_id=None):
+        """ Returns the hint of a container, or None, counting hits and
+        misses
+
+        :rtype: PrfHint
+        """
+
+        with self._lock:
+            for key in container_keys(path, volume_id):
+                hint = self._hints.get(key)
+                if hint is not None:
+                    self.hits += 1
+                    return hint
+
+            self.misses += 1
+
+    def record_fallback(self):
+        """ Counts a hinted mount which fell back to auto-detection """
+
+        with self._lock:
+            self.fallbacks += 1
+
+    def remember(self, path, volume_id, hint):
+        """ Stores the hint of a container under all its keys """
+
+        keys = container_keys(path, volume_id)
+        with self._lock:
+            if all(self._hints.get(key) == hint for key in keys):
+                return
+
+            for key in keys:
+                self._hints[key] = hint
+            self._save()
+
+    def forget(self, path, volume_id=None):
+        """ Drops the hint of a container """
+
+        keys = container_keys(path, volume_id)
+        with self._lock:
+            if not any(key in self._hints for key in keys):
+                return
+
+            for key in keys:
+                self._hints.pop(key, None)
+            self._save()
+
+    def __len__(self):
+        return len(self._hints)
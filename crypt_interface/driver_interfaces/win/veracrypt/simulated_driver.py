@@ -0,0 +1,433 @@
+"""
+In-process simulation of the VeraCrypt driver, speaking the ioctl protocol
+over the driver_models structs. It allows running VeraCryptInterface off
+Windows, e.g. for load testing and benchmarks.
+"""
+
+import collections
+import ctypes
+import hashlib
+import itertools
+import threading
+import time
+
+from crypt_interface.driver_interfaces.exceptions import HandleOpenError
+from crypt_interface.driver_interfaces.win import win_constants
+from crypt_interface.driver_interfaces.win.kernel32_interface import (
+    BaseTransport)
+from crypt_interface.driver_interfaces.win.veracrypt import (
+    constants, driver_models, layouts, veracrypt_interface)
+
+# passwords kept by the driver cache
+PASSWORD_CACHE_SIZE = 16
+
+
+class SimulatedContainer(object):
+    """ A volume container known by the simulated driver """
+
+    def __init__(self, path, password, label='', disk_length=1 << 30,
+                 enc_algorithm=constants.EncryptionAlgorithm.AES,
+                 volume_type=constants.VolumeType.PROP_VOL_TYPE_NORMAL,
+                 truecrypt_mode=False,
+                 pkcs5_prf=constants.Pkcs5Prf.SHA512, pim=0):
+        self.path = path
+        self.password = password
+        self.label = label
+        self.disk_length = disk_length
+        self.enc_algorithm = enc_algorithm
+        self.volume_type = volume_type
+        self.truecrypt_mode = truecrypt_mode
+        self.pkcs5_prf = pkcs5_prf
+        self.pim = pim
+
+        self.volume_id = hashlib.sha256(path.encode()).digest()[
+            :win_constants.VOLUME_ID_SIZE]
+
+        # I/O counters reported in the volume properties
+        self.total_bytes_read = 0
+        self.total_bytes_written = 0
+
+        # driver id of the current mount
+        self.unique_id = 0
+
+        # if True, dismounting without ignore_open_files fails
+        self.files_opened = False
+
+
+class SimulatedDriverTransport(BaseTransport):
+    """ Transport implementing the VeraCrypt driver ioctls in-process.
+
+    Errors can be injected per control code: WinErrorCodes fail the
+    DeviceIoControl call itself, MountErrorCodes and UnMountErrorCodes are
+    returned by the driver in nReturnCode.
+    """
+
+    def __init__(self, latency=0.0, open_latency=0.0, version=0x0125,
+                 derivation_latency=0.0, max_handles=None,
+                 logical_drives=0):
+        """
+        :param latency: seconds spent in each ioctl, either a number or a
+        dict of constants.CtlCodes: seconds
+        :param open_latency: seconds spent opening a handle
+        :param derivation_latency: seconds spent per header key derivation
+        while mounting, i.e. per PRF tried
+        :param version: VERSION_NUM reported by the driver, which selects
+        the struct layout it speaks
+        :param max_handles: maximum number of handles opened at once, past
+        which opens fail with ERROR_SHARING_VIOLATION
+        :param logical_drives: bitmask of the drive letters used by the
+        simulated OS besides the mounted volumes, e.g. 1 << 2 for C:
+        """
+
+        self.latency = latency
+        self.open_latency = open_latency
+        self.version = version
+        self.derivation_latency = derivation_latency
+        self.max_handles = max_handles
+        self.logical_drives = logical_drives
+
+        self.containers = {}
+        self.mounted = {}
+
+        # (password, PIM) tuples cached by the mounts, oldest first
+        self.password_cache = collections.deque(maxlen=PASSWORD_CACHE_SIZE)
+
+        self.open_count = 0
+        self.ioctl_count = 0
+        # header key derivations run by the mounts
+        self.derivation_count = 0
+
+        self._errors = collections.defaultdict(collections.deque)
+        self._open_errors = collections.deque()
+        self._handles = itertools.count(1)
+        self._unique_ids = itertools.count(1)
+        self._opened = set()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+        layout = layouts.find_layout(version)
+        self._handlers = {
+            constants.CtlCodes.TC_IOCTL_GET_DRIVER_VERSION.value: (
+                driver_models.DriverVersionStruct, self._get_driver_version),
+            constants.CtlCodes.TC_IOCTL_GET_MOUNTED_VOLUMES.value: (
+                layout.resolve(driver_models.MountListStruct),
+                self._get_mounted_volumes),
+            constants.CtlCodes.TC_IOCTL_MOUNT_VOLUME.value: (
+                layout.resolve(driver_models.MountStruct),
+                self._mount_volume),
+            constants.CtlCodes.TC_IOCTL_DISMOUNT_VOLUME.value: (
+                layout.resolve(driver_models.UnMountStruct),
+                self._dismount_volume),
+            constants.CtlCodes.TC_IOCTL_DISMOUNT_ALL_VOLUMES.value: (
+                layout.resolve(driver_models.UnMountStruct),
+                self._dismount_all_volumes),
+            constants.CtlCodes.TC_IOCTL_GET_VOLUME_PROPERTIES.value: (
+                layout.resolve(driver_models.VolumePropertiesStruct),
+                self._get_volume_properties),
+            constants.CtlCodes.TC_IOCTL_GET_PASSWORD_CACHE_STATUS.value: (
+                None, self._get_password_cache_status),
+            constants.CtlCodes.TC_IOCTL_WIPE_PASSWORD_CACHE.value: (
+                None, self._wipe_password_cache),
+        }
+
+    def add_container(self, path, password, **kwargs):
+        """ Registers a container which can then be mounted
+
+        :rtype: SimulatedContainer
+        """
+
+        container = SimulatedContainer(path, password, **kwargs)
+        with self._lock:
+            self.containers[path] = container
+
+        return container
+
+    def inject_error(self, control_code, error, count=1):
+        """ Makes the next calls with a control code fail
+
+        :param control_code: member of constants.CtlCodes
+        :param error: member of WinErrorCodes, MountErrorCodes or
+        UnMountErrorCodes
+        :param count: number of calls which will fail
+        """
+
+        with self._lock:
+            self._errors[control_code.value].extend([error] * count)
+
+    def inject_open_error(self, error, count=1):
+        """ Makes the next handle opens fail
+
+        :param error: member of WinErrorCodes
+        :param count: number of opens which will fail
+        """
+
+        with self._lock:
+            self._open_errors.extend([error] * count)
+
+    def _sleep(self, control_code):
+        latency = self.latency
+        if isinstance(latency, dict):
+            latency = latency.get(constants.CtlCodes(control_code), 0.0)
+
+        if latency:
+            time.sleep(latency)
+
+    def _set_last_error(self, error):
+        self._local.last_error = error
+
+    def open(self, path):
+        if self.open_latency:
+            time.sleep(self.open_latency)
+
+        with self._lock:
+            error = None
+            if self._open_errors:
+                error = self._open_errors.popleft()
+            elif self.max_handles is not None and \
+                    len(self._opened) >= self.max_handles:
+                error = win_constants.WinErrorCodes.ERROR_SHARING_VIOLATION
+
+            if error is not None:
+                self._set_last_error(error.value)
+                raise HandleOpenError(
+                    'Failed to open {}. GetLastError(): {}'.format(
+                        path, error.value), error.value)
+
+            self.open_count += 1
+            handle = next(self._handles)
+            self._opened.add(handle)
+
+        return handle
+
+    def close(self, handle):
+        with self._lock:
+            self._opened.discard(handle)
+
+    def is_valid(self, handle):
+        return handle in self._opened
+
+    def get_last_error(self):
+        return getattr(self._local, 'last_error', 0)
+
+    def get_logical_drives(self):
+        with self._lock:
+            mask = self.logical_drives
+            for drive_no in self.mounted:
+                mask |= 1 << drive_no
+
+        return mask
+
+    def ioctl(self, handle, control_code, in_buffer, in_size,
+              out_buffer, out_size):
+        self._sleep(control_code)
+
+        with self._lock:
+            self.ioctl_count += 1
+
+            if handle not in self._opened:
+                self._set_last_error(
+                    win_constants.WinErrorCodes.ERROR_INVALID_HANDLE.value)
+                return 0, 0
+
+            struct_class, handler = self._handlers[control_code]
+            struct_size = 0
+            if struct_class is not None:
+                struct_size = ctypes.sizeof(struct_class)
+
+            if out_size < struct_size:
+                self._set_last_error(win_constants.WinErrorCodes
+                                     .ERROR_INSUFFICIENT_BUFFER.value)
+                return 0, 0
+
+            error = None
+            if self._errors[control_code]:
+                error = self._errors[control_code].popleft()
+
+            if isinstance(error, win_constants.WinErrorCodes):
+                self._set_last_error(error.value)
+                return 0, 0
+
+            struct = None
+            if struct_class is not None:
+                struct = ctypes.cast(
+                    out_buffer, ctypes.POINTER(struct_class)).contents
+
+            # handlers return a WinErrorCodes member to fail the call
+            error = handler(struct, error)
+            if error is not None:
+                self._set_last_error(error.value)
+                return 0, 0
+
+        # key derivations don't hold the driver lock
+        derivation_time = getattr(self._local, 'derivation_time', 0.0)
+        if derivation_time:
+            self._local.derivation_time = 0.0
+            time.sleep(derivation_time)
+
+        return 1, struct_size
+
+    def _get_driver_version(self, version_buffer, error):
+        version_buffer.version = self.version
+
+    def _get_mounted_volumes(self, mount_list, error):
+        ctypes.memset(ctypes.addressof(mount_list), 0,
+                      ctypes.sizeof(mount_list))
+
+        for drive_no, container in self.mounted.items():
+            mount_list.ulMountedDrives |= 1 << drive_no
+            mount_list.wszVolume[drive_no].value = '\\??\\' + container.path
+            mount_list.wszLabel[drive_no].value = container.label
+            ctypes.memmove(ctypes.addressof(mount_list.volumeID[drive_no]),
+                           container.volume_id, win_constants.VOLUME_ID_SIZE)
+            mount_list.diskLength[drive_no] = container.disk_length
+            mount_list.ea[drive_no] = container.enc_algorithm.value
+            mount_list.volumeType[drive_no] = container.volume_type.value
+            mount_list.truecryptMode[drive_no] = container.truecrypt_mode
+
+    def _mount_volume(self, mount, error):
+        if error is not None:
+            mount.nReturnCode = error.value
+            return
+
+        container = self.containers.get(mount.wszVolume)
+        password = bytes(mount.VolumePassword.Text)[
+            :mount.VolumePassword.Length]
+
+        # without a password, the driver tries the cached ones
+        credentials = [(password, mount.VolumePim)] if password \
+            else list(self.password_cache)
+
+        # like the driver, burn the password once read
+        ctypes.memset(ctypes.addressof(mount.VolumePassword), 0,
+                      ctypes.sizeof(mount.VolumePassword))
+
+        if container is None:
+            mount.nReturnCode = constants.MountErrorCodes.OS_ERROR.value
+        elif not 0 <= mount.nDosDriveNo < win_constants.MAX_VOLUMES or \
+                mount.nDosDriveNo in self.mounted or \
+                self.logical_drives & (1 << mount.nDosDriveNo):
+            mount.nReturnCode = constants.MountErrorCodes.DRIVE_OCCUPIED.value
+        elif not self._open_header(
+                container, credentials, mount.pkcs5_prf):
+            mount.nReturnCode = constants.MountErrorCodes.ACCESS_DENIED.value
+        else:
+            if password and mount.bCache:
+                credential = (password, mount.VolumePim if mount.bCachePim
+                              else 0)
+                if credential not in self.password_cache:
+                    self.password_cache.append(credential)
+
+            self.mounted[mount.nDosDriveNo] = container
+            container.unique_id = next(self._unique_ids)
+            mount.nReturnCode = 0
+
+    def _open_header(self, container, credentials, prf):
+        """ Tries the credentials, and for each of them the PRFs allowed by
+        the mount request, in order, as the driver does. Returns True if the
+        container header opened.
+
+        :param credentials: list of (password, PIM) tuples, a PIM of 0
+        stands for the container's
+        :param prf: value of constants.Pkcs5Prf, 0 to try all of them
+        """
+
+        if prf:
+            candidates = [constants.Pkcs5Prf(prf)]
+        else:
+            candidates = [member for member in constants.Pkcs5Prf
+                          if member is not constants.Pkcs5Prf.NONE]
+
+        tried = 0
+        opened = False
+        for password, pim in credentials:
+            if password == container.password and \
+                    container.pkcs5_prf in candidates and \
+                    pim in (0, container.pim):
+                tried += candidates.index(container.pkcs5_prf) + 1
+                opened = True
+                break
+
+            tried += len(candidates)
+
+        self.derivation_count += tried
+        self._local.derivation_time = tried * self.derivation_latency
+
+        return opened
+
+    def _get_password_cache_status(self, struct, error):
+        if not self.password_cache:
+            return win_constants.WinErrorCodes.ERROR_NO_DATA
+
+    def _wipe_password_cache(self, struct, error):
+        self.password_cache.clear()
+
+    def _get_volume_properties(self, properties, error):
+        container = self.mounted.get(properties.driveNo)
+        if container is None:
+            return win_constants.WinErrorCodes.ERROR_INVALID_PARAMETER
+
+        drive_no = properties.driveNo
+        ctypes.memset(ctypes.addressof(properties), 0,
+                      ctypes.sizeof(properties))
+
+        properties.driveNo = drive_no
+        properties.uniqueId = container.unique_id
+        properties.wszVolume = '\\??\\' + container.path
+        properties.wszLabel = container.label
+        properties.diskLength = container.disk_length
+        properties.ea = container.enc_algorithm.value
+        # XTS
+        properties.mode = 1
+        properties.pkcs5 = container.pkcs5_prf.value
+        properties.volumePim = container.pim
+        properties.hiddenVolume = container.volume_type is \
+            constants.VolumeType.PROP_VOL_TYPE_HIDDEN
+        properties.removable = True
+        properties.totalBytesRead = container.total_bytes_read
+        properties.totalBytesWritten = container.total_bytes_written
+        properties.volumeID[:] = container.volume_id
+
+    def _dismount(self, drive_no, ignore_open_files):
+        """ Dismounts a drive and returns the driver return code """
+
+        container = self.mounted.get(drive_no)
+        if container is None:
+            return constants.UnMountErrorCodes.VOLUME_NOT_MOUNTED.value
+
+        if container.files_opened and not ignore_open_files:
+            return constants.UnMountErrorCodes.FILES_OPENED.value
+
+        del self.mounted[drive_no]
+        return 0
+
+    def _dismount_volume(self, unmount, error):
+        if error is not None:
+            unmount.nReturnCode = error.value
+            return
+
+        unmount.nReturnCode = self._dismount(
+            unmount.nDosDriveNo, unmount.ignoreOpenFiles)
+
+    def _dismount_all_volumes(self, unmount, error):
+        if error is not None:
+            unmount.nReturnCode = error.value
+            return
+
+        unmount.nReturnCode = 0
+        for drive_no in list(self.mounted):
+            return_code = self._dismount(drive_no, unmount.ignoreOpenFiles)
+            if return_code:
+                unmount.nReturnCode = return_code
+
+
+class SimulatedVeraCryptInterface(veracrypt_interface.VeraCryptInterface):
+    """ VeraCryptInterface bound to a SimulatedDriverTransport """
+
+    def __init__(self, driver=None, **kwargs):
+        """
+        :param driver: the SimulatedDriverTransport, a new one is
+        created if not given
+        """
+
+        self.driver = driver or SimulatedDriverTransport()
+        super().__init__(transport=self.driver, **kwargs)
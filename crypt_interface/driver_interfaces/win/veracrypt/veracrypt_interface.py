@@ -1,13 +1,18 @@
+import copy
 import ctypes
 import ctypes.wintypes as wintypes
+import threading
+import time
 from functools import partial
 
 from crypt_interface.driver_interfaces import (
-    win, exceptions, base_crypt_interface)
+    exceptions, base_crypt_interface, async_crypt_interface, metrics, retry)
+from crypt_interface.driver_interfaces.win import (
+    base_win_driver_models, base_win_models, drive_letters, win_constants)
 from crypt_interface.driver_interfaces.win.kernel32_interface import (
-    DeviceIoControl,)
+    DeviceIoControl, HandlePool)
 from crypt_interface.driver_interfaces.win.veracrypt import (
-    models, constants, driver_models)
+    models, constants, driver_models, layouts)
 
 
 def prepend_error_message(val, prefix, enum_class):
@@ -22,107 +27,600 @@ def prepend_error_message(val, prefix, enum_class):
 prepend_error_code_message = partial(
     prepend_error_message, prefix='error code {}')
 
+# transient errors seen under contention, retried by RetryPolicies using them
+RETRY_RULES = (
+    # another process holds the driver or the volume
+    retry.RetryRule(
+        'sharing_violation', exceptions.DriverCallError,
+        codes=[win_constants.WinErrorCodes.ERROR_SHARING_VIOLATION.value],
+        budget=8),
+    # files are still opened on a volume being dismounted
+    retry.RetryRule(
+        'files_opened', exceptions.DismountError,
+        codes=[constants.UnMountErrorCodes.FILES_OPENED.value],
+        budget=3),
+)
+
 
 class VeraCryptInterface(base_crypt_interface.BaseCryptInterface):
-    def get_mounted_volumes(self):
-        error_message_template = 'List mounted volumes failed: {}'
+    def __init__(self, transport=None, pool_size=4, integrity_level=None,
+                 verify_mounted_drives=False, metrics_sink=None,
+                 driver_layout=None, wipe_passwords=True, prf_hints=None,
+                 remember_pim=False, retry_policy=None,
+                 drive_allocator=None):
+        """
+        :param transport: the transport used to reach the driver, defaults
+        to kernel32_interface.Kernel32Transport
+        :param pool_size: maximum number of idle driver handles kept open
+        :param integrity_level: member of base_win_driver_models.IntegrityLevel
+        used to check the returned structs, defaults to the struct setting
+        :param verify_mounted_drives: if True, the mounted drives bitmask
+        is cross-checked against the volume paths on every listing
+        :param metrics_sink: metrics.MetricsSink receiving the driver calls
+        timings and failures, metrics are disabled if not set
+        :param driver_layout: layouts.StructLayout used for the driver
+        structs, skipping the driver version handshake. By default it's
+        selected from the driver version on the first call.
+        :param wipe_passwords: if True, mutable password buffers (e.g.
+        bytearray) are zeroed once the mount call returned. The copy in
+        the driver struct is always wiped.
+        :param prf_hints: prf_hints.PrfHintStore remembering the PRF which
+        opened each container, passed to the driver on later mounts to
+        skip the PRF auto-detection. Hints are disabled if not set.
+        :param remember_pim: if True, the PIM is remembered and passed
+        along with the PRF
+        :param retry_policy: retry.RetryPolicy applied to the operations,
+        e.g. retry.RetryPolicy(RETRY_RULES). Operations aren't retried if
+        not set.
+        :param drive_allocator: drive_letters.DriveLetterAllocator picking
+        the drive of the volumes mounted without drive_no, by default one
+        over the logical drives reported by the transport
+        """
 
-        # build the output struct
-        mount_list = driver_models.MountListStruct()
-        p_mount_list = ctypes.pointer(mount_list)
+        self.pool = HandlePool(constants.VERACRYPT_DRIVER_PATH,
+                               transport=transport, max_idle=pool_size)
+        self.arena = base_win_driver_models.StructArena()
+        self.integrity_level = integrity_level
+        self.verify_mounted_drives = verify_mounted_drives
+        self.metrics = metrics_sink or metrics.NULL_SINK
+        self.wipe_passwords = wipe_passwords
+        self.prf_hints = prf_hints
+        self.remember_pim = remember_pim
+        self.retry = retry_policy or retry.NO_RETRY
+        self.drive_allocator = drive_allocator or \
+            drive_letters.DriveLetterAllocator(
+                logical_drives=self.pool.transport.get_logical_drives)
 
-        # run DeviceIoControl using the get_mounted_volumes control code
-        with DeviceIoControl(constants.VERACRYPT_DRIVER_PATH) as dctl:
-            returned_count, _ = dctl.ioctl(
-                constants.CtlCodes.TC_IOCTL_GET_MOUNTED_VOLUMES.value,
-                p_mount_list, ctypes.sizeof(driver_models.MountListStruct),
-                p_mount_list, ctypes.sizeof(driver_models.MountListStruct))
+        self.driver_version = None
+        self.driver_layout = driver_layout
+        self._handshake_lock = threading.Lock()
+
+        # volume id: VolumeProperties, without the volatile fields updated
+        self._properties_cache = {}
+        self._properties_lock = threading.Lock()
+
+    def close(self):
+        self.pool.close()
+        self.arena.clear()
+
+    def _open_driver(self):
+        """ Returns a DeviceIoControl context borrowing a pooled handle """
+
+        return DeviceIoControl(constants.VERACRYPT_DRIVER_PATH,
+                               pool=self.pool, metrics=self.metrics)
+
+    def _run_ioctl(self, control_code, struct, error_message_template,
+                   dctl=None):
+        """ Runs DeviceIoControl on a pooled driver handle, using the struct
+        as both input and output buffer
+
+        :param control_code: member of constants.CtlCodes
+        :param struct: the input/output struct, None for the control codes
+        without buffers
+        :param error_message_template: template of the raised error message
+        :param dctl: an entered DeviceIoControl to issue the call on, a
+        handle is borrowed for the call if not set
+        """
+
+        p_struct = None
+        struct_size = 0
+        if struct is not None:
+            p_struct = ctypes.pointer(struct)
+            struct_size = ctypes.sizeof(struct)
+
+        try:
+            if dctl is None:
+                with self._open_driver() as dctl:
+                    status, _ = dctl.ioctl(
+                        control_code.value,
+                        p_struct, struct_size, p_struct, struct_size)
+            else:
+                status, _ = dctl.ioctl(
+                    control_code.value,
+                    p_struct, struct_size, p_struct, struct_size)
+        except exceptions.HandleOpenError as e:
+            self.metrics.increment(
+                'operation_failures_total', operation=control_code.name,
+                error=metrics.error_label(
+                    e.code, win_constants.WinErrorCodes))
+            raise
 
         # check for failed execution
-        if not returned_count:
-            raise exceptions.DriverException(error_message_template.format(
+        if not status:
+            self.metrics.increment(
+                'operation_failures_total', operation=control_code.name,
+                error=metrics.error_label(
+                    dctl.last_error, win_constants.WinErrorCodes))
+
+            raise exceptions.DriverCallError(error_message_template.format(
                 'DeviceIoControl call failed: {}'.format(
                     prepend_error_code_message(
-                        val=ctypes.windll.kernel32.GetLastError(),
-                        enum_class=win.win_constants.WinErrorCodes))))
+                        val=dctl.last_error,
+                        enum_class=win_constants.WinErrorCodes))),
+                dctl.last_error)
+
+        if struct is None:
+            return
 
         # check for struct alignment issues
-        mount_list.check_excess_buffer()
+        with self.metrics.timed('integrity_check_seconds',
+                                operation=control_code.name):
+            struct.check_excess_buffer(self.integrity_level)
+
+    def _handshake(self):
+        """ Queries the driver version, once per interface lifetime, and
+        selects the matching struct layout
+        """
+
+        with self._handshake_lock:
+            if self.driver_layout is not None:
+                return
+
+            version_buffer = driver_models.DriverVersionStruct()
+            self._run_ioctl(constants.CtlCodes.TC_IOCTL_GET_DRIVER_VERSION,
+                            version_buffer, 'Get driver version failed: {}')
+
+            self.driver_version = version_buffer.version
+            self.driver_layout = layouts.find_layout(self.driver_version)
+
+    def _get_struct(self, struct_class):
+        """ Returns the zeroed arena instance of the struct class matching
+        the driver layout
+
+        :param struct_class: a driver_models struct class
+        """
+
+        if self.driver_layout is None:
+            self._handshake()
+
+        return self.arena.get(self.driver_layout.resolve(struct_class))
+
+    def _check_return_code(self, control_code, return_code, enum_class,
+                           error_message_template, error_class):
+        """ Raises an error_class exception, a subclass of
+        exceptions.DriverReturnCodeError, if the driver returned an error code
+        """
+
+        if return_code == 0:
+            return
+
+        self.metrics.increment(
+            'operation_failures_total', operation=control_code.name,
+            error=metrics.error_label(return_code, enum_class))
+
+        raise error_class(error_message_template.format(
+            prepend_error_code_message(
+                val=return_code, enum_class=enum_class)), return_code)
+
+    def _decode_volumes(self, mount_list):
+        """ Converts the mount list struct to Volumes """
+
+        operation = constants.CtlCodes.TC_IOCTL_GET_MOUNTED_VOLUMES.name
+        with self.metrics.timed('decode_seconds', operation=operation):
+            return models.Volume.mount_list_to_volume_list(
+                mount_list, verify=self.verify_mounted_drives)
+
+    def _list_mounted(self, dctl=None):
+        """ Runs the get_mounted_volumes ioctl
+
+        :param dctl: an entered DeviceIoControl to issue the call on
+
+        :rtype: driver_models.MountListStruct
+        """
+
+        error_message_template = 'List mounted volumes failed: {}'
+
+        # build the output struct
+        mount_list = self._get_struct(driver_models.MountListStruct)
+
+        # run DeviceIoControl using the get_mounted_volumes control code
+        self._run_ioctl(constants.CtlCodes.TC_IOCTL_GET_MOUNTED_VOLUMES,
+                        mount_list, error_message_template, dctl)
+
+        self.drive_allocator.observe_mounted(mount_list.ulMountedDrives)
+
+        return mount_list
+
+    def get_mounted_volumes(self):
+        mount_list = self.retry.call(
+            self._list_mounted, operation='get_mounted_volumes')
 
         # convert resulting struct to Volume
-        return models.Volume.mount_list_to_volume_list(mount_list)
+        return self._decode_volumes(mount_list)
 
-    def mount_volume(self, volume, password):
-        error_message_template = 'Mount volume "{}" failed: {}'.format(
-            volume.path, '{}')
+    def poll_mounted_volumes(self, mounted_drives=None):
+        mount_list = self.retry.call(
+            self._list_mounted, operation='poll_mounted_volumes')
+        mask = mount_list.ulMountedDrives
+
+        # skip decoding when the mounted drives didn't change
+        if mask == mounted_drives:
+            return mask, None
+
+        return mask, self._decode_volumes(mount_list)
+
+    def _fetch_properties(self, drive_no, dctl):
+        """ Runs the get_volume_properties ioctl for a drive. The immutable
+        properties of an already seen mount are taken from the cache and
+        only the volatile fields are decoded.
+
+        :rtype: models.VolumeProperties
+        """
+
+        error_message_template = 'Get volume properties "{}" failed: {}' \
+            .format(chr(ord('A') + drive_no), '{}')
+        control_code = constants.CtlCodes.TC_IOCTL_GET_VOLUME_PROPERTIES
 
         # build the input/output struct
-        mount_buffer = driver_models.MountStruct()
-        mount_buffer.wszVolume = volume.path
-        mount_buffer.VolumePassword.Length = len(password)
-        mount_buffer.VolumePassword.Text = \
-            driver_models.VCCConverters.bytes_to_password_text(password)
-        mount_buffer.nDosDriveNo = volume.drive_no
-        mount_buffer.bMountRemovable = win.win_constants.TRUE
-        mount_buffer.bMountManager = win.win_constants.TRUE
-        mount_buffer.bPreserveTimestamp = win.win_constants.TRUE
-
-        p_mount_buffer = ctypes.pointer(mount_buffer)
+        properties_buffer = self._get_struct(
+            driver_models.VolumePropertiesStruct)
+        properties_buffer.driveNo = drive_no
 
-        # run DeviceIoControl with the mount_volume control code
-        with DeviceIoControl(constants.VERACRYPT_DRIVER_PATH) as dctl:
-            returned_count, _ = dctl.ioctl(
-                constants.CtlCodes.TC_IOCTL_MOUNT_VOLUME.value,
-                p_mount_buffer, ctypes.sizeof(driver_models.MountStruct),
-                p_mount_buffer, ctypes.sizeof(driver_models.MountStruct))
+        # run DeviceIoControl with the get_volume_properties control code
+        self._run_ioctl(control_code, properties_buffer,
+                        error_message_template, dctl)
 
-        # check for failed execution
-        if not returned_count:
-            raise exceptions.DriverException(error_message_template.format(
-                'DeviceIoControl call failed: {}'.format(
-                    prepend_error_code_message(
-                        val=ctypes.windll.kernel32.GetLastError(),
-                        enum_class=win.win_constants.WinErrorCodes))))
+        volume_id = bytes(properties_buffer.volumeID)
+        with self._properties_lock:
+            cached = self._properties_cache.get(volume_id)
 
-        # check for struct alignment issues
-        mount_buffer.check_excess_buffer()
+        with self.metrics.timed('decode_seconds',
+                                operation=control_code.name):
+            # the unique id changes on every mount, e.g. when the volume
+            # was remounted with other options
+            if cached is not None and \
+                    cached.unique_id == properties_buffer.uniqueId and \
+                    cached.drive_no == drive_no:
+                properties = copy.copy(cached)
+                properties_buffer.codec.update(
+                    properties, properties_buffer,
+                    models.VolumeProperties.volatile_fields)
+                return properties
+
+            properties, = properties_buffer.codec.decode_slots(
+                properties_buffer, (0,), models.VolumeProperties)
+
+        with self._properties_lock:
+            self._properties_cache[volume_id] = properties
+
+        return copy.copy(properties)
+
+    def get_volume_properties(self, drive_nos=None):
+        """ Retrieves the properties of several mounted volumes, issuing
+        all the driver calls over a single handle
+
+        :param drive_nos: iterable of drive numbers, defaults to all the
+        mounted drives
+
+        :rtype: List[models.VolumeProperties]
+        """
+
+        return self.retry.call(self._get_volume_properties, drive_nos,
+                               operation='get_volume_properties')
+
+    def _get_volume_properties(self, drive_nos):
+        with self._open_driver() as dctl:
+            if drive_nos is None:
+                drive_nos = list(base_win_models.drive_numbers_from_mask(
+                    self._list_mounted(dctl).ulMountedDrives))
+                self._prune_properties(drive_nos)
+
+            return [self._fetch_properties(drive_no, dctl)
+                    for drive_no in drive_nos]
+
+    def _prune_properties(self, mounted_drive_nos=()):
+        """ Drops the cached properties of the dismounted drives. Stale
+        entries are harmless, as remounts are detected by their unique id.
+        """
+
+        with self._properties_lock:
+            self._properties_cache = {
+                volume_id: properties
+                for volume_id, properties in self._properties_cache.items()
+                if properties.drive_no in mounted_drive_nos}
+
+    def _build_mount_struct(self, volume, password, cache_password=False,
+                            cache_pim=False):
+        """ Builds the input/output struct used to mount a volume """
+
+        mount_buffer = self._get_struct(driver_models.MountStruct)
+        mount_buffer.codec.encode(volume, mount_buffer, ('path', 'drive_no'))
+        mount_buffer.VolumePassword.write(password)
+        mount_buffer.bCache = wintypes.BOOL(cache_password)
+        mount_buffer.bCachePim = wintypes.BOOL(cache_pim)
+        mount_buffer.bMountRemovable = win_constants.TRUE
+        mount_buffer.bMountManager = win_constants.TRUE
+        mount_buffer.bPreserveTimestamp = win_constants.TRUE
+
+        return mount_buffer
+
+    def _mount(self, mount_buffer, error_message_template):
+        """ Runs the mount_volume ioctl for a built MountStruct """
+
+        # run DeviceIoControl with the mount_volume control code
+        self._run_ioctl(constants.CtlCodes.TC_IOCTL_MOUNT_VOLUME,
+                        mount_buffer, error_message_template)
 
         # check for failed return code from driver
-        if not mount_buffer.nReturnCode == 0:
-            raise exceptions.DriverException(error_message_template.format(
+        self._check_return_code(
+            constants.CtlCodes.TC_IOCTL_MOUNT_VOLUME,
+            mount_buffer.nReturnCode, constants.MountErrorCodes,
+            error_message_template, exceptions.MountError)
+
+    def mount_volume(self, volume, password, wipe_password=None,
+                     cache_password=False, cache_pim=False, hint=None,
+                     preferred_drives=None, excluded_drives=None):
+        """ Mounts a volume. If volume.drive_no is None, a free drive is
+        allocated and set on the volume.
+
+        :param password: bytes, bytearray or memoryview. If empty, the
+        driver tries the passwords of its cache.
+        :param wipe_password: if True, the password buffer is zeroed once
+        the driver was called, defaults to the wipe_passwords setting
+        :param cache_password: if True, the driver adds the password to
+        its cache once the volume is mounted
+        :param cache_pim: if True, the driver caches the PIM as well
+        :param hint: prf_hints.PrfHint to try when the hint store has none
+        :param preferred_drives: drive letters or numbers tried first when
+        allocating the drive
+        :param excluded_drives: drive letters or numbers not allocated
+        """
+
+        self._mount_volume(volume, password, wipe_password, cache_password,
+                           cache_pim, hint, preferred_drives, excluded_drives)
+
+    def _mount_volume(self, volume, password, wipe_password=None,
+                      cache_password=False, cache_pim=False, hint=None,
+                      preferred_drives=None, excluded_drives=None,
+                      learn_hint=False):
+        """ Mounts a volume, see mount_volume
+
+        :param learn_hint: if True, the PRF which opened the volume is read
+        even without a hint store
+        :return: the PrfHint which opened the volume, if it was read
+        """
+
+        error_message_template = 'Mount volume "{}" failed: {}'.format(
+            volume.path, '{}')
+
+        if wipe_password is None:
+            wipe_password = self.wipe_passwords
+
+        def attempt():
+            mount_buffer = self._build_mount_struct(
+                volume, password, cache_password, cache_pim)
+            try:
+                return self._mount_hinted(
+                    volume, password, mount_buffer, error_message_template,
+                    hint, learn_hint)
+            finally:
+                base_win_driver_models.wipe(mount_buffer.VolumePassword)
+
+        try:
+            if volume.drive_no is None:
+                return self._mount_allocated(
+                    volume, attempt, preferred_drives, excluded_drives)
+
+            learned = self.retry.call(attempt, operation='mount_volume')
+            self.drive_allocator.mark_mounted(volume.drive_no)
+            return learned
+        finally:
+            if wipe_password:
+                base_win_driver_models.wipe(password)
+
+    def _mount_allocated(self, volume, attempt, preferred_drives=None,
+                         excluded_drives=None):
+        """ Mounts a volume on a reserved free drive. Drives found occupied
+        by the driver, e.g. taken by another process since the last
+        listing, are skipped until a mount succeeds.
+
+        :param attempt: function mounting the volume on volume.drive_no
+        :return: the result of the successful attempt
+        """
+
+        excluded = drive_letters.drive_numbers(excluded_drives)
+        while True:
+            drive_no = self.drive_allocator.reserve(
+                preferred_drives, excluded)
+            volume.drive_no = drive_no
+
+            try:
+                result = self.retry.call(attempt, operation='mount_volume')
+            except exceptions.MountError as e:
+                self.drive_allocator.release(drive_no)
+                volume.drive_no = None
+                if e.code != constants.MountErrorCodes.DRIVE_OCCUPIED.value:
+                    raise
+
+                self.drive_allocator.mark_mounted(drive_no)
+                excluded.append(drive_no)
+                continue
+            except BaseException:
+                self.drive_allocator.release(drive_no)
+                volume.drive_no = None
+                raise
+
+            self.drive_allocator.release(drive_no, mounted=True)
+            return result
+
+    def _mount_hinted(self, volume, password, mount_buffer,
+                      error_message_template, hint=None, learn_hint=False):
+        """ Mounts with the remembered PRF of the container, falling back
+        to auto-detection if the driver denies the access. The PRF which
+        opened an unhinted container is learned after the mount.
+
+        :param learn_hint: if True, the PRF is learned even without a hint
+        store
+        :return: the PrfHint which opened the volume, None if it wasn't
+        learned
+        """
+
+        if self.prf_hints is not None:
+            stored_hint = self.prf_hints.lookup(volume.path, volume.volume_id)
+            self.metrics.increment(
+                'prf_hints_total',
+                result='miss' if stored_hint is None else 'hit')
+            hint = stored_hint or hint
+
+        if hint is not None:
+            mount_buffer.pkcs5_prf = hint.prf.value
+            mount_buffer.VolumePim = hint.pim
+            try:
+                self._mount(mount_buffer, error_message_template)
+                return hint
+            except exceptions.MountError as e:
+                if e.code != constants.MountErrorCodes.ACCESS_DENIED.value:
+                    raise
+
+            # stale hint or wrong password, retry with auto-detection
+            if self.prf_hints is not None:
+                self.prf_hints.record_fallback()
+            self.metrics.increment('prf_hints_total', result='fallback')
+
+            # the driver burns the password of the struct it was given
+            mount_buffer.VolumePassword.write(password)
+            mount_buffer.pkcs5_prf = constants.Pkcs5Prf.NONE.value
+            mount_buffer.VolumePim = 0
+            mount_buffer.nReturnCode = 0
+
+        self._mount(mount_buffer, error_message_template)
+
+        if self.prf_hints is None and not learn_hint:
+            return None
+
+        hint, volume_id = self._read_prf_hint(mount_buffer.nDosDriveNo)
+        if self.prf_hints is not None and hint is not None:
+            self.prf_hints.remember(volume.path, volume_id, hint)
+
+        return hint
+
+    def _read_prf_hint(self, drive_no):
+        """ Reads the PRF, and optionally the PIM, of a mounted volume from
+        its properties
+
+        :return: a tuple of the PrfHint and the volume id, or of Nones if
+        the properties are unavailable
+        """
+
+        # imported on first use, it's slow to import
+        from crypt_interface.driver_interfaces.win.veracrypt import (
+            prf_hints)
+
+        try:
+            properties, = self.get_volume_properties([drive_no])
+        except exceptions.DriverException:
+            # the mount succeeded, the hint is only an optimization
+            return None, None
+
+        prf = properties.pkcs5_prf
+        if not isinstance(prf, constants.Pkcs5Prf) or \
+                prf is constants.Pkcs5Prf.NONE:
+            return None, None
+
+        pim = properties.pim if self.remember_pim else 0
+        return prf_hints.PrfHint(prf, pim), properties.volume_id
+
+    def get_password_cache_status(self):
+        """ Returns True if the driver password cache holds passwords """
+
+        with self._open_driver() as dctl:
+            status, _ = dctl.ioctl(
+                constants.CtlCodes.TC_IOCTL_GET_PASSWORD_CACHE_STATUS.value,
+                None, 0, None, 0)
+
+        if status:
+            return True
+
+        # the driver reports an empty cache as a failed call
+        if dctl.last_error == win_constants.WinErrorCodes.ERROR_NO_DATA.value:
+            return False
+
+        raise exceptions.DriverCallError(
+            'Get password cache status failed: {}'.format(
                 prepend_error_code_message(
-                    val=mount_buffer.nReturnCode,
-                    enum_class=constants.MountErrorCodes)))
+                    val=dctl.last_error,
+                    enum_class=win_constants.WinErrorCodes)),
+            dctl.last_error)
+
+    def wipe_password_cache(self):
+        """ Wipes the passwords and PIMs cached by the driver """
+
+        self._run_ioctl(constants.CtlCodes.TC_IOCTL_WIPE_PASSWORD_CACHE,
+                        None, 'Wipe password cache failed: {}')
+
+    def mount_session(self, password, cache_pim=False):
+        """ Starts a session mounting several volumes which share a
+        password, through the driver password cache
+
+        :param password: the shared password
+        :param cache_pim: if True, the PIM is cached as well
+
+        :rtype: MountSession
+        """
+
+        return MountSession(self, password, cache_pim)
+
+    def _mount_request(self, request):
+        # the passwords are wiped once the whole batch is done, as they
+        # may be shared by several requests
+        self.mount_volume(request.volume, request.password,
+                          wipe_password=False)
+
+    def mount_volumes(self, requests, max_workers=4):
+        """ Mounts several volumes concurrently. Each worker thread reuses
+        the same MountStruct, wiped after every call, and the password
+        buffers are wiped after the batch, so that requests can share one
+        buffer.
+        """
+
+        requests = [base_crypt_interface.MountRequest(*request)
+                    for request in requests]
+
+        try:
+            return super().mount_volumes(requests, max_workers)
+        finally:
+            if self.wipe_passwords:
+                for request in requests:
+                    base_win_driver_models.wipe(request.password)
 
     def dismount_volume(self, volume, ignore_open_files=False):
+        self.retry.call(self._dismount_volume, volume, ignore_open_files,
+                        operation='dismount_volume')
+
+    def _dismount_volume(self, volume, ignore_open_files):
         drive_letter = chr(ord('A') + volume.drive_no)
         error_message_template = 'Dismount volume "{}" failed: {}'.format(
             drive_letter, '{}')
 
         # build the input/output struct
-        dismount_buffer = driver_models.UnMountStruct()
+        dismount_buffer = self._get_struct(driver_models.UnMountStruct)
 
         dismount_buffer.nDosDriveNo = volume.drive_no
         dismount_buffer.ignoreOpenFiles = wintypes.BOOL(ignore_open_files)
-        p_dismount_buffer = ctypes.pointer(dismount_buffer)
 
         # run DeviceIoControl with the dismount_volume control code
-        with DeviceIoControl(constants.VERACRYPT_DRIVER_PATH) as dctl:
-            returned_count, _ = dctl.ioctl(
-                constants.CtlCodes.TC_IOCTL_DISMOUNT_VOLUME.value,
-                p_dismount_buffer, ctypes.sizeof(driver_models.UnMountStruct),
-                p_dismount_buffer, ctypes.sizeof(driver_models.UnMountStruct))
-
-        # check for failed execution
-        if not returned_count:
-            raise exceptions.DriverException(error_message_template.format(
-                'DeviceIoControl call failed: {}'.format(
-                    prepend_error_code_message(
-                        val=ctypes.windll.kernel32.GetLastError(),
-                        enum_class=win.win_constants.WinErrorCodes))))
-
-        # check for struct alignment issues
-        dismount_buffer.check_excess_buffer()
+        self._run_ioctl(constants.CtlCodes.TC_IOCTL_DISMOUNT_VOLUME,
+                        dismount_buffer, error_message_template)
 
         # check for hidden volume protection trigger event
         if dismount_buffer.HiddenVolumeProtectionTriggered:
@@ -130,8 +628,186 @@ class VeraCryptInterface(base_crypt_interface.BaseCryptInterface):
                 'Hidden volume protection was trigered!'.format(drive_letter)))
 
         # check for failed return code from driver
-        if not dismount_buffer.nReturnCode == 0:
-            raise exceptions.DriverException(error_message_template.format(
-                prepend_error_code_message(
-                    val=dismount_buffer.nReturnCode,
-                    enum_class=constants.UnMountErrorCodes)))
+        self._check_return_code(
+            constants.CtlCodes.TC_IOCTL_DISMOUNT_VOLUME,
+            dismount_buffer.nReturnCode, constants.UnMountErrorCodes,
+            error_message_template, exceptions.DismountError)
+
+        self.drive_allocator.mark_dismounted(volume.drive_no)
+
+    def dismount_all(self, ignore_open_files=False):
+        """ Dismounts all volumes with a single driver call
+
+        :param ignore_open_files: force the dismount even if files are
+        opened on the volumes
+
+        :rtype: models.DismountAllResult
+        """
+
+        error_message_template = 'Dismount all volumes failed: {}'
+
+        # build the input/output struct
+        dismount_buffer = self._get_struct(driver_models.UnMountStruct)
+        dismount_buffer.ignoreOpenFiles = wintypes.BOOL(ignore_open_files)
+
+        # run DeviceIoControl with the dismount_all_volumes control code
+        self.retry.call(
+            self._run_ioctl, constants.CtlCodes.TC_IOCTL_DISMOUNT_ALL_VOLUMES,
+            dismount_buffer, error_message_template, operation='dismount_all')
+
+        result, = dismount_buffer.codec.decode_slots(
+            dismount_buffer, (0,), models.DismountAllResult)
+
+        # the driver only returns the last failure, so the volumes which
+        # are still mounted are the ones that failed to dismount
+        if result.return_code != 0:
+            operation = constants.CtlCodes.TC_IOCTL_DISMOUNT_ALL_VOLUMES.name
+            self.metrics.increment(
+                'operation_failures_total', operation=operation,
+                error=metrics.error_label(
+                    result.return_code, constants.UnMountErrorCodes))
+
+            reason = prepend_error_code_message(
+                val=result.return_code,
+                enum_class=constants.UnMountErrorCodes)
+
+            for volume in self.get_mounted_volumes():
+                result.failed[volume.drive_no] = reason
+
+        if result.return_code == 0:
+            self.drive_allocator.observe_mounted(0)
+
+        self._prune_properties(result.failed)
+
+        return result
+
+
+class MountSession(object):
+    """ Mounts volumes sharing a password through the driver password
+    cache. The first successful mount sends the password and caches it, the
+    next ones send no password and let the driver use its cache, along with
+    the PRF which opened the first volume. The driver cache is wiped when
+    the session exits, whatever the outcome.
+
+    Usage:
+        with interface.mount_session(password) as session:
+            session.mount_volumes(volumes)
+        results = session.results
+    """
+
+    def __init__(self, interface, password, cache_pim=False):
+        """
+        :param interface: the VeraCryptInterface
+        :param password: the shared password, wiped on exit if mutable and
+        wipe_passwords is set on the interface
+        :param cache_pim: if True, the PIM is cached as well
+        """
+
+        self.interface = interface
+        self.password = password
+        self.cache_pim = cache_pim
+
+        # SessionMountResults, in mount order
+        self.results = []
+
+        # PRF which opened the first volume
+        self.hint = None
+
+        self._cached = False
+        self._lock = threading.Lock()
+
+    def mount(self, volume):
+        """ Mounts a volume within the session
+
+        :raises DriverException: if the mount failed
+        :rtype: SessionMountResult
+        """
+
+        result = self._mount(volume)
+        if result.error is not None:
+            raise result.error
+
+        return result
+
+    def _mount(self, volume):
+        """ Mounts a volume, returning the SessionMountResult even when the
+        mount failed
+        """
+
+        from_cache = self._cached
+        password = b'' if from_cache else self.password
+
+        start = time.perf_counter()
+        error = None
+        hint = None
+        try:
+            # the first mount learns the PRF which opened the volume
+            hint = self.interface._mount_volume(
+                volume, password, wipe_password=False,
+                cache_password=not from_cache, cache_pim=self.cache_pim,
+                hint=self.hint, learn_hint=not from_cache)
+        except exceptions.DriverException as e:
+            error = e
+
+        result = models.SessionMountResult(
+            base_crypt_interface.MountRequest(volume, None), error,
+            time.perf_counter() - start, from_cache)
+
+        if error is None and not from_cache:
+            with self._lock:
+                self._cached = True
+                self.hint = hint
+
+        with self._lock:
+            self.results.append(result)
+
+        return result
+
+    def mount_volumes(self, volumes, max_workers=4):
+        """ Mounts several volumes, the first ones one at a time until the
+        password is cached, the rest concurrently. A failed mount doesn't
+        abort the others.
+
+        :rtype: base_crypt_interface.BulkMountResult
+        """
+
+        # imported on first use, it's slow to import
+        from concurrent.futures import ThreadPoolExecutor
+
+        volumes = list(volumes)
+        results = []
+
+        start = time.perf_counter()
+        while volumes and not self._cached:
+            results.append(self._mount(volumes.pop(0)))
+
+        if volumes:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results.extend(executor.map(self._mount, volumes))
+
+        return base_crypt_interface.BulkMountResult(
+            results, time.perf_counter() - start)
+
+    def close(self):
+        """ Wipes the driver password cache and the session password """
+
+        try:
+            self.interface.wipe_password_cache()
+        finally:
+            self._cached = False
+            if self.interface.wipe_passwords:
+                base_win_driver_models.wipe(self.password)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tb):
+        self.close()
+
+
+class AsyncVeraCryptInterface(async_crypt_interface.AsyncCryptInterface):
+    """ asyncio counterpart of VeraCryptInterface """
+
+    def __init__(self, *args, max_workers=4, **kwargs):
+        super().__init__(VeraCryptInterface, *args,
+                         max_workers=max_workers, **kwargs)
@@ -59,13 +59,25 @@ class WinErrorCodes(base_constants.PrintableEnum):
         https://msdn.microsoft.com/en-us/library/windows/desktop/ms681381(v=vs.85).aspx
     """
 
+    # the handle is invalid
+    ERROR_INVALID_HANDLE = 6
+
     # cannot access the file because it is being used by another process
     ERROR_SHARING_VIOLATION = 32
 
+    # the parameter is incorrect
+    ERROR_INVALID_PARAMETER = 87
+
     # the data passed to a system call is too small
     ERROR_INSUFFICIENT_BUFFER = 122
 
+    # the pipe is being closed, e.g. the driver has nothing to return
+    ERROR_NO_DATA = 232
+
 WinErrorCodes._labels = {
+    WinErrorCodes.ERROR_INVALID_HANDLE: 'The handle is invalid.',
     WinErrorCodes.ERROR_SHARING_VIOLATION: 'File is in use.',
-    WinErrorCodes.ERROR_INSUFFICIENT_BUFFER: 'Data passed is too small.'
+    WinErrorCodes.ERROR_INVALID_PARAMETER: 'The parameter is incorrect.',
+    WinErrorCodes.ERROR_INSUFFICIENT_BUFFER: 'Data passed is too small.',
+    WinErrorCodes.ERROR_NO_DATA: 'The pipe is being closed.',
 }
@@ -0,0 +1,67 @@
+""" Tests of the Linux backend against the sysfs/procfs fixture tree of
+tests/fixtures/linux_root
+
+Run with: python -m unittest tests.test_linux_veracrypt
+"""
+
+import unittest
+from pathlib import Path
+
+from crypt_interface.driver_interfaces.linux.veracrypt import (
+    models, veracrypt_interface)
+
+FIXTURE_ROOT = Path(__file__).parent / 'fixtures' / 'linux_root'
+
+
+def volume_fields(volume):
+    return (volume.drive_no, volume.dm_name, volume.device, volume.path,
+            volume.mount_point, volume.disk_length, volume.volume_id,
+            volume.is_mounted)
+
+
+class LinuxVeraCryptInterfaceTest(unittest.TestCase):
+
+    def test_get_mounted_volumes(self):
+        interface = veracrypt_interface.LinuxVeraCryptInterface(
+            root=FIXTURE_ROOT)
+
+        volumes = interface.get_mounted_volumes()
+
+        self.assertTrue(all(isinstance(volume, models.LinuxVolume)
+                            for volume in volumes))
+        self.assertEqual([volume_fields(volume) for volume in volumes], [
+            (1, 'veracrypt1', '/dev/mapper/veracrypt1',
+             '/home/user/containers/a.hc', '/media/veracrypt1',
+             2048 * 512, b'CRYPT-PLAIN-veracrypt1', True),
+            # dm-crypt volume of another tool: offset minor number, first
+            # mount point with its escapes decoded, backing block device
+            ((1 << 16) + 1, 'luks-1234', '/dev/mapper/luks-1234',
+             '/dev/sda2', '/media/my disk', 4096 * 512,
+             b'CRYPT-LUKS2-1234-luks-1234', True),
+        ])
+
+    def test_get_mounted_volumes_without_dm_crypt(self):
+        interface = veracrypt_interface.LinuxVeraCryptInterface(
+            root=FIXTURE_ROOT, include_dm_crypt=False)
+
+        self.assertEqual(
+            [volume.dm_name for volume in interface.get_mounted_volumes()],
+            ['veracrypt1'])
+
+    def test_dismount_command(self):
+        interface = veracrypt_interface.LinuxVeraCryptInterface(
+            root=FIXTURE_ROOT, cli='veracrypt')
+        volume = models.LinuxVolume()
+        volume.path = '/home/user/containers/a.hc'
+
+        self.assertEqual(interface._dismount_command(volume), [
+            'veracrypt', '--text', '--non-interactive', '--dismount',
+            '/home/user/containers/a.hc'])
+        self.assertEqual(
+            interface._dismount_command(volume, ignore_open_files=True), [
+                'veracrypt', '--text', '--non-interactive', '--dismount',
+                '--force', '/home/user/containers/a.hc'])
+
+
+if __name__ == '__main__':
+    unittest.main()